@@ -2,15 +2,33 @@
 # filepath: C:\Users\BenjaminFort_5rlaw0g\source\repos\utilities\pdf-to-image\pdf_to_image.py
 import os
 import sys
+import io
 import argparse
+import glob
+import hashlib
+import json
+import math
+import mmap
+import re
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
 import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext, redirect_stdout
+from functools import lru_cache
 from pathlib import Path
-from PyPDF2 import PdfReader
-from pdf2image import convert_from_path
-from pdf2image.exceptions import PDFPageCountError
 
+# PyPDF2, PIL and pdf2image are imported where they are used, so --help,
+# argument errors and runs that skip every page start without loading them
+
+@lru_cache(maxsize=None)
 def get_poppler_path():
-    """Get the path to bundled Poppler or system Poppler"""
+    """Get the path to bundled Poppler or system Poppler (looked up once per process)"""
     if getattr(sys, 'frozen', False):
         # Running as PyInstaller bundle
         bundle_dir = Path(sys._MEIPASS)
@@ -33,19 +51,130 @@ def get_poppler_path():
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Convert PDF to images.')
-    parser.add_argument('pdf_path', help='Path to the PDF file')
+    parser.add_argument('pdf_paths', nargs='*', metavar='pdf_path',
+                        help='PDF files, directories or glob patterns (read from stdin when omitted)')
+    parser.add_argument('--from-file', help='Text file listing PDF paths, one per line ("-" for stdin)')
     parser.add_argument('--output-dir', help='Output directory for the images')
+    parser.add_argument('--archive', metavar='PATH',
+                        help='Write the pages into one .zip, .tar or multi-page .tiff file ("-" for a TAR on stdout)')
+    parser.add_argument('--archive-format', choices=sorted(ARCHIVE_FORMATS),
+                        help='Archive format when the --archive name does not tell (default: from the extension)')
     parser.add_argument('--dpi', type=int, default=150, help='Image resolution in DPI (default: 150)')
-    parser.add_argument('--format', choices=['jpg', 'png'], default='jpg', help='Image format (jpg or png)')
+    parser.add_argument('--format', choices=['jpg', 'png', 'tiff', 'auto'], default='jpg',
+                        help='Image format (jpg, png or tiff); auto picks PNG or JPEG for each page')
+    parser.add_argument('--color-mode', choices=sorted(COLOR_MODE_ARGS), default='color',
+                        help='Render pages in colour, grayscale or 1-bit black and white (default: color)')
+    parser.add_argument('--sizes', type=check_sizes,
+                        help='Write several sizes from one render, e.g. "150dpi,800px,200px" (overrides --dpi)')
+    parser.add_argument('--max-width', type=int, metavar='PX',
+                        help='Render each page at the largest size at most this many pixels wide (overrides --dpi)')
+    parser.add_argument('--max-height', type=int, metavar='PX',
+                        help='Render each page at the largest size at most this many pixels high (overrides --dpi)')
+    parser.add_argument('--long-edge', type=int, metavar='PX',
+                        help='Render each page with its longer edge at most this many pixels (overrides --dpi)')
+    parser.add_argument('--profile', choices=sorted(ENCODER_PROFILES), default='balanced',
+                        help='Encoder profile: fast, balanced or smallest (default: balanced)')
+    parser.add_argument('--quality', type=int, choices=range(1, 101), metavar='1-100',
+                        help='JPEG quality (overrides the profile; above 95 mostly adds size)')
+    parser.add_argument('--png-compress-level', type=int, choices=range(10), metavar='0-9',
+                        help='PNG zlib compression level (overrides the profile)')
+    parser.add_argument('--progressive', action=argparse.BooleanOptionalAction,
+                        help='Write progressive JPEGs (overrides the profile)')
+    parser.add_argument('--subsampling', choices=['4:4:4', '4:2:2', '4:2:0'],
+                        help='JPEG chroma subsampling (overrides the profile)')
+    parser.add_argument('--pages', type=check_page_selection,
+                        help='Pages to convert, e.g. "1,5,200-210", "1" for a preview or "10-" (default: all)')
     parser.add_argument('--overwrite', action='store_true', help='Overwrite existing files')
+    parser.add_argument('--blank-pages', choices=BLANK_PAGE_ACTIONS,
+                        help='Find blank pages before rendering and skip them or write a white placeholder instead')
+    parser.add_argument('--confirm-blank', action='store_true',
+                        help='With --blank-pages, also check pages without text (scans) with a low resolution render')
+    parser.add_argument('--verify-existing', action='store_true',
+                        help='Re-render existing images whose file header is missing or truncated')
     parser.add_argument('--batch-size', type=int, default=5, help='Number of pages to process at once (default: 5)')
+    parser.add_argument('--memory-budget', type=int, metavar='MB',
+                        help='Size batches from the page dimensions so rendered pages stay within this many MB')
     parser.add_argument('--timeout', type=int, default=300, help='Timeout per batch in seconds (default: 300)')
+    parser.add_argument('--tiles', choices=['deepzoom', 'xyz', 'tiff'],
+                        help='Render large pages in regions into a DeepZoom or XYZ tile pyramid or a striped TIFF')
+    parser.add_argument('--tile-size', type=int, default=256, help='Tile size in pixels for --tiles (default: 256)')
+    parser.add_argument('--page-timeout', type=int,
+                        help='Seconds per page allowed when a failed batch is retried in smaller ranges '
+                             '(default: the --timeout of a whole batch)')
+    parser.add_argument('--failure-report', metavar='PATH',
+                        help='Write the pages that could not be converted to this JSON file')
+    parser.add_argument('--workers', type=int, default=1, help='Number of batches rendered in parallel (default: 1)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream pages from Poppler one at a time to keep memory at about one page')
+    parser.add_argument('--direct', action='store_true',
+                        help='Let Poppler write the image files itself instead of re-encoding them with PIL')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not read or write the on-disk cache of PDF metadata')
+    parser.add_argument('--render-cache', action='store_true',
+                        help='Reuse images rendered earlier for the same PDF content and settings')
+    parser.add_argument('--render-cache-size', type=int, default=1024,
+                        help='Size limit of the render cache in MB (default: 1024)')
+    parser.add_argument('--metrics-file', help='Append per-page timing events to this file as JSON lines')
     return parser.parse_args()
 
 
+def check_page_selection(spec):
+    """argparse type that validates a --pages selection and keeps it as text"""
+    try:
+        parse_page_ranges(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return spec
+
+
+def check_sizes(spec):
+    """argparse type that parses a --sizes list"""
+    try:
+        return parse_sizes(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def read_path_list(source):
+    """Read PDF paths from a list file or stdin ("-"), one per line"""
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.startswith('#')]
+
+
+def expand_pdf_paths(inputs):
+    """
+    Expand files, directories and glob patterns into a list of PDF files.
+    
+    Directories contribute the PDFs directly inside them. Duplicates are
+    dropped while keeping the order the inputs were given in.
+    """
+    pdf_paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = sorted(str(path) for path in Path(item).iterdir()
+                             if path.is_file() and path.suffix.lower() == '.pdf')
+        elif glob.has_magic(item):
+            matches = sorted(path for path in glob.glob(item, recursive=True) if os.path.isfile(path))
+        else:
+            matches = [item]
+        
+        for path in matches:
+            if path not in pdf_paths:
+                pdf_paths.append(path)
+    
+    return pdf_paths
+
+
 def get_output_directory(pdf_path, output_dir=None):
     if output_dir:
         output_directory = Path(output_dir)
+    elif isinstance(pdf_path, PDFInput):
+        # A PDF given as data has no directory of its own
+        output_directory = Path.cwd()
     else:
         # Default to the same directory as the PDF
         output_directory = Path(pdf_path).parent
@@ -56,22 +185,493 @@ def get_output_directory(pdf_path, output_dir=None):
     return output_directory
 
 
+def get_cache_dir():
+    """Get the directory for on-disk caches (PDF_TO_IMAGE_CACHE overrides the default)"""
+    if os.environ.get('PDF_TO_IMAGE_CACHE'):
+        return Path(os.environ['PDF_TO_IMAGE_CACHE'])
+    if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+        return Path(os.environ['LOCALAPPDATA']) / 'pdf_to_image' / 'cache'
+    return Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'pdf_to_image'
+
+
+def read_cache_entry(path):
+    """Read a JSON cache entry, returning None if it is missing or unreadable"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache_entry(path, data):
+    """Write a JSON cache entry atomically; caching problems never fail a conversion"""
+    try:
+        os.makedirs(Path(path).parent, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+def get_file_digest(pdf_path, use_cache=True):
+    """
+    Get the SHA-256 of a file's contents.
+    
+    The digest is remembered on disk together with the file's size and
+    modification time, so unchanged files are not read again.
+    """
+    if isinstance(pdf_path, PDFInput):
+        return pdf_path.get_digest()
+    
+    stat = os.stat(pdf_path)
+    absolute_path = os.path.abspath(pdf_path)
+    entry_path = None
+    if use_cache:
+        path_key = hashlib.sha1(absolute_path.encode('utf-8')).hexdigest()
+        entry_path = get_cache_dir() / 'paths' / f"{path_key}.json"
+        entry = read_cache_entry(entry_path)
+        if (entry and entry.get('path') == absolute_path and entry.get('size') == stat.st_size
+                and entry.get('mtime_ns') == stat.st_mtime_ns):
+            return entry['sha256']
+    
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+    
+    if entry_path:
+        write_cache_entry(entry_path, {
+            'path': absolute_path,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': sha256
+        })
+    return sha256
+
+
+class PDFInput:
+    """
+    A PDF given as bytes, an mmap or a binary file object instead of a path.
+    
+    Metadata is parsed from the data where it is, without copying bytes,
+    mmaps or seekable files. Poppler only reads files, so the data is written
+    once to a temporary file that every batch renders from; it is removed on
+    close. bytearray and memoryview data is copied to bytes once.
+    """
+    
+    def __init__(self, data, name=None):
+        if isinstance(data, (bytearray, memoryview)):
+            data = bytes(data)
+        elif not isinstance(data, (bytes, mmap.mmap)):
+            if not hasattr(data, 'read'):
+                raise TypeError(f"Expected a PDF path, bytes, mmap or file object, got {type(data).__name__}")
+            if not (hasattr(data, 'seekable') and data.seekable()):
+                data = data.read()
+        self.data = data
+        file_name = getattr(data, 'name', None)
+        self.name = name or (Path(file_name).stem if isinstance(file_name, str) else 'document')
+        self.lock = threading.Lock()
+        self.temp_dir = None
+        self.path = None
+    
+    def __str__(self):
+        return f"{self.name} (in memory)"
+    
+    def open_stream(self):
+        """Get a binary stream positioned at the start of the data"""
+        if isinstance(self.data, bytes):
+            # BytesIO shares the bytes object's buffer until it is written to
+            return io.BytesIO(self.data)
+        self.data.seek(0)
+        return self.data
+    
+    def get_digest(self):
+        """Get the SHA-256 of the data"""
+        if isinstance(self.data, (bytes, mmap.mmap)):
+            return hashlib.sha256(self.data).hexdigest()
+        digest = hashlib.sha256()
+        stream = self.open_stream()
+        for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+            digest.update(chunk)
+        return digest.hexdigest()
+    
+    def get_path(self):
+        """Get the path of a file holding the data, writing it on first use"""
+        with self.lock:
+            if self.path is None:
+                self.temp_dir = tempfile.mkdtemp(prefix='pdf_to_image_')
+                path = os.path.join(self.temp_dir, 'input.pdf')
+                with open(path, 'wb') as f:
+                    if isinstance(self.data, (bytes, mmap.mmap)):
+                        f.write(self.data)
+                    else:
+                        shutil.copyfileobj(self.open_stream(), f)
+                self.path = path
+            return self.path
+    
+    def close(self):
+        if self.temp_dir:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            self.temp_dir = self.path = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def get_pdf_name(pdf_path):
+    """Get the base name used for a PDF's image files"""
+    if isinstance(pdf_path, PDFInput):
+        return pdf_path.name
+    return Path(pdf_path).stem
+
+
+def get_render_path(pdf_path):
+    """Get the file Poppler renders a PDF from"""
+    if isinstance(pdf_path, PDFInput):
+        return pdf_path.get_path()
+    return pdf_path
+
+
+class PDFDocumentInfo:
+    """Page metadata of a PDF, parsed once and shared by everything that needs it"""
+    
+    # Bump when the cached fields change so stale entries are re-parsed
+    CACHE_VERSION = 2
+    
+    def __init__(self, path, sha256, pages):
+        self.path = str(path)
+        self.sha256 = sha256
+        # One dict per page: width, height (mediabox, points), rotation,
+        # has_images, has_text, has_annotations and draws (whether its
+        # content can mark the page at all)
+        self.pages = pages
+    
+    @property
+    def page_count(self):
+        return len(self.pages)
+    
+    @property
+    def page_dimensions(self):
+        """(width, height) of each page in points as it will be rendered, i.e. after rotation"""
+        dimensions = []
+        for page in self.pages:
+            if page['rotation'] % 180:
+                dimensions.append((page['height'], page['width']))
+            else:
+                dimensions.append((page['width'], page['height']))
+        return dimensions
+    
+    @classmethod
+    def from_reader(cls, path, sha256, pdf_reader):
+        """Build the page metadata from an open PdfReader"""
+        pages = []
+        subtypes = {}
+        for page in pdf_reader.pages:
+            resources = page.get('/Resources')
+            resources = resources.get_object() if resources is not None else {}
+            xobjects = resources.get('/XObject')
+            xobjects = xobjects.get_object() if xobjects is not None else {}
+            pages.append({
+                'width': float(page.mediabox.width),
+                'height': float(page.mediabox.height),
+                'rotation': int(page.get('/Rotate', 0) or 0) % 360,
+                'has_images': any(get_xobject_subtype(pdf_reader, xobjects.raw_get(name), subtypes) == '/Image'
+                                  for name in xobjects),
+                'has_text': bool(resources.get('/Font')),
+                'has_annotations': bool(page.get('/Annots')),
+                'draws': bool(xobjects) or get_content_draws(page)
+            })
+        return cls(path, sha256, pages)
+    
+    @classmethod
+    def from_dict(cls, path, data):
+        return cls(path, data['sha256'], data['pages'])
+    
+    def to_dict(self):
+        return {'version': self.CACHE_VERSION, 'sha256': self.sha256, 'pages': self.pages}
+
+
+def get_xobject_subtype(pdf_reader, reference, subtypes):
+    """
+    Get the /Subtype of an XObject, holding at most one XObject stream at a time.
+    
+    Resolving an XObject reads its whole stream, which the reader then keeps
+    cached, so a scanned PDF would be held in memory twice. An XObject the
+    reader had not already cached is dropped from its cache again once the
+    subtype is known.
+    
+    Args:
+        subtypes: Dict of the subtypes found so far by (generation, idnum),
+            so an XObject shared by many pages is only read once
+    """
+    if not hasattr(reference, 'idnum'):
+        return reference.get('/Subtype')
+    key = (reference.generation, reference.idnum)
+    if key not in subtypes:
+        cached = key in pdf_reader.resolved_objects
+        subtypes[key] = reference.get_object().get('/Subtype')
+        if not cached:
+            pdf_reader.resolved_objects.pop(key, None)
+    return subtypes[key]
+
+
+def get_content_draws(page):
+    """
+    Check whether a page's content streams contain an operator that marks the page.
+    
+    Streams are decoded one at a time and the check stops as soon as the
+    content passes BLANK_PROBE_BYTES; longer or unreadable content is taken
+    to draw.
+    """
+    contents = page.get('/Contents')
+    if contents is None:
+        return False
+    contents = contents.get_object()
+    streams = [stream.get_object() for stream in contents] if isinstance(contents, list) else [contents]
+    chunks = []
+    size = 0
+    try:
+        for stream in streams:
+            chunks.append(stream.get_data())
+            size += len(chunks[-1])
+            if size > BLANK_PROBE_BYTES:
+                return True
+    except Exception:
+        return True
+    data = b' '.join(chunks)
+    # Drop literal strings so their text is not mistaken for operators
+    data = re.sub(rb'\((?:\\.|[^\\)])*\)', b' ', data)
+    return any(token.decode('latin-1') in PAINT_OPERATORS for token in re.split(rb'[\s\[\]<>/{}]+', data))
+
+
+# Content up to this many decoded bytes is checked for whether the page draws anything
+BLANK_PROBE_BYTES = 1024
+
+# Content stream operators that put marks on the page
+PAINT_OPERATORS = {'f', 'F', 'f*', 'B', 'B*', 'b', 'b*', 'S', 's', 'sh', 'Do', 'Tj', 'TJ', "'", '"', 'BI'}
+
+
+def load_document_info(pdf_path, use_cache=True):
+    """
+    Get the PDFDocumentInfo for a PDF.
+    
+    Parsed metadata is cached on disk by content hash, so repeat runs and
+    batch jobs skip parsing files they have already seen. pdf_path may also
+    be a PDFInput, which is parsed from memory.
+    """
+    sha256 = None
+    if use_cache:
+        sha256 = get_file_digest(pdf_path)
+        entry_path = get_cache_dir() / 'documents' / f"{sha256}.json"
+        entry = read_cache_entry(entry_path)
+        if entry and entry.get('version') == PDFDocumentInfo.CACHE_VERSION:
+            return PDFDocumentInfo.from_dict(pdf_path, entry)
+    
+    # PyPDF2 is only imported when the PDF has to be parsed
+    from PyPDF2 import PdfReader
+    
+    source = pdf_path.open_stream() if isinstance(pdf_path, PDFInput) else pdf_path
+    info = PDFDocumentInfo.from_reader(pdf_path, sha256, PdfReader(source))
+    if use_cache:
+        write_cache_entry(entry_path, info.to_dict())
+    return info
+
+
 def get_page_dimensions(pdf_path):
     """Get dimensions of each page in the PDF in points"""
-    pdf_reader = PdfReader(pdf_path)
-    dimensions = []
+    return load_document_info(pdf_path).page_dimensions
+
+
+def emit_event(settings, event, **fields):
+    """Send a conversion event to the on_event callback in settings, if any"""
+    on_event = settings.get('on_event')
+    if on_event:
+        on_event({'event': event, 'time': time.time(), **fields})
+
+
+class MetricsCollector:
+    """
+    Conversion event subscriber that adds up the time spent in each stage.
+    
+    Events are forwarded to the given subscribers, so one collector can sit
+    in front of a MetricsWriter or a caller's own callback. Events arrive
+    from worker threads.
+    """
+    
+    def __init__(self, *subscribers):
+        self.subscribers = [subscriber for subscriber in subscribers if subscriber]
+        self.lock = threading.Lock()
+        self.seconds = {'parse': 0.0, 'render': 0.0, 'encode': 0.0, 'write': 0.0}
+        self.pages = 0
+        self.skipped = 0
+        self.bytes_written = 0
+    
+    def __call__(self, event):
+        with self.lock:
+            if event['event'] == 'parse':
+                self.seconds['parse'] += event['seconds']
+            elif event['event'] == 'page':
+                self.pages += 1
+                self.bytes_written += event['bytes']
+                for stage in ('render', 'encode', 'write'):
+                    self.seconds[stage] += event[f'{stage}_seconds']
+            elif event['event'] == 'skip':
+                self.skipped += 1
+        for subscriber in self.subscribers:
+            subscriber(event)
+    
+    def summary(self):
+        stages = ', '.join(f"{stage} {seconds:.1f}s" for stage, seconds in self.seconds.items())
+        return (f"Stage time: {stages} ({self.pages} pages, {self.skipped} skipped, "
+                f"{self.bytes_written / (1024 * 1024):.1f} MB written)")
+
+
+class MetricsWriter:
+    """Conversion event subscriber that appends each event to a JSON-lines file"""
+    
+    def __init__(self, path):
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
     
-    for page in pdf_reader.pages:
-        # Extract page dimensions in points (1/72 inch)
-        width = page.mediabox.width
-        height = page.mediabox.height
-        dimensions.append((width, height))
+    def __call__(self, event):
+        line = json.dumps(event, default=str)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
     
-    return dimensions
+    def close(self):
+        self.file.close()
 
 
-def display_page_info(page_dimensions, dpi):
-    """Display page dimensions and resulting image size information"""
+def link_or_copy(source, destination):
+    """Hardlink source to destination, copying when a link is not possible"""
+    temp_path = f"{destination}.part"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        shutil.copyfile(source, temp_path)
+    os.replace(temp_path, destination)
+
+
+class RenderCache:
+    """
+    On-disk cache of rendered page images, keyed by PDF content and settings.
+    
+    Entries are evicted least recently used first once the cache grows past
+    max_bytes. Hits are linked (or copied) into the output directory instead
+    of being rendered again.
+    """
+    
+    # Settings that change the bytes of a rendered page
+    KEY_SETTINGS = ('dpi', 'format', 'save_options', 'color_mode', 'pixel_limits')
+    
+    def __init__(self, directory=None, max_bytes=1024 * 1024 * 1024):
+        self.directory = Path(directory) if directory else get_cache_dir() / 'renders'
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.lock = threading.Lock()
+        self.total_bytes = None
+    
+    def get_entry_path(self, sha256, page_num, settings):
+        key_data = {name: settings.get(name) for name in self.KEY_SETTINGS}
+        key_data.update(sha256=sha256, page=page_num)
+        key = hashlib.sha256(json.dumps(key_data, sort_keys=True).encode('utf-8')).hexdigest()
+        return self.directory / key[:2] / f"{key}.{settings['format']}"
+    
+    def fetch(self, sha256, page_num, settings, output_path):
+        """Place a cached page at output_path, returning False on a cache miss"""
+        entry_path = self.get_entry_path(sha256, page_num, settings)
+        try:
+            link_or_copy(entry_path, output_path)
+            size = os.path.getsize(entry_path)
+            # Touch the entry so eviction sees it as recently used
+            os.utime(entry_path)
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return False
+        
+        with self.lock:
+            self.hits += 1
+            self.bytes_saved += size
+        return True
+    
+    def store(self, sha256, page_num, settings, output_path):
+        """Add a freshly written page to the cache"""
+        entry_path = self.get_entry_path(sha256, page_num, settings)
+        try:
+            os.makedirs(entry_path.parent, exist_ok=True)
+            link_or_copy(output_path, entry_path)
+            size = os.path.getsize(entry_path)
+        except OSError:
+            return
+        
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = self.get_size()
+            else:
+                self.total_bytes += size
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+    
+    def get_size(self):
+        return sum(path.stat().st_size for path in self.directory.glob('*/*') if path.is_file())
+    
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for path in self.directory.glob('*/*'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+        self.total_bytes = total
+    
+    def restore_pages(self, sha256, page_numbers, output_directory, pdf_name, settings):
+        """Fill pages from the cache, returning the page numbers that still need rendering"""
+        missing = []
+        for page_num in page_numbers:
+            output_path = Path(output_directory) / get_output_filename(pdf_name, page_num, settings['format'])
+            if self.fetch(sha256, page_num, settings, output_path):
+                emit_event(settings, 'skip', pdf=settings.get('pdf_path'), page=page_num, reason='cached')
+            else:
+                missing.append(page_num)
+        return missing
+    
+    def summary(self):
+        return (f"Render cache: {self.hits} hit(s), {self.misses} miss(es), "
+                f"{self.bytes_saved / (1024 * 1024):.1f} MB reused")
+
+
+def display_page_info(page_dimensions, dpi, page_sizes=None, page_dpis=None):
+    """
+    Display page dimensions and resulting image size information.
+    
+    page_sizes maps page numbers to the (width, height) in pixels of pages
+    fitted to pixel limits; those pages are shown at that size. page_dpis
+    maps page numbers to the DPI of pages rendered at a DPI of their own.
+    """
     print("\nPDF Page Information:")
     print("---------------------")
     
@@ -80,126 +680,2020 @@ def display_page_info(page_dimensions, dpi):
         width_in = width_pt / 72
         height_in = height_pt / 72
         
+        if page_sizes and i + 1 in page_sizes:
+            width_px, height_px = page_sizes[i + 1]
+            print(f"Page {i+1}: {width_in:.2f}\" x {height_in:.2f}\" → {width_px} x {height_px} pixels "
+                  f"(at {width_px / width_in:.0f} DPI)")
+            continue
+        
+        page_dpi = page_dpis.get(i + 1, dpi) if page_dpis else dpi
+        
         # Calculate resulting image dimensions in pixels
-        width_px = int(width_in * dpi)
-        height_px = int(height_in * dpi)
+        width_px = int(width_in * page_dpi)
+        height_px = int(height_in * page_dpi)
         
-        print(f"Page {i+1}: {width_in:.2f}\" x {height_in:.2f}\" → {width_px} x {height_px} pixels at {dpi} DPI")
+        print(f"Page {i+1}: {width_in:.2f}\" x {height_in:.2f}\" → {width_px} x {height_px} pixels "
+              f"at {page_dpi} DPI")
+
+
+# Leading bytes every valid file of the given format starts with
+IMAGE_SIGNATURES = {
+    'jpg': (b'\xff\xd8\xff',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'tiff': (b'II*\x00', b'MM\x00*'),
+}
+
+
+def get_output_filename(pdf_name, page_num, format, size=None):
+    """Get the output filename for a page: [pdf_name]_[page_number](_[size]).[format]"""
+    if size:
+        return f"{pdf_name}_{page_num}_{size}.{format}"
+    return f"{pdf_name}_{page_num}.{format}"
+
 
+def get_output_filenames(pdf_name, page_num, format, sizes=None):
+    """Get the filenames of every image written for a page"""
+    if not sizes:
+        return [get_output_filename(pdf_name, page_num, format)]
+    return [get_output_filename(pdf_name, page_num, format, size['label']) for size in sizes]
 
-def convert_pdf_to_images(pdf_path, output_dir=None, dpi=150, format='jpg', overwrite=False, batch_size=5, timeout=300):
+
+def parse_sizes(spec):
     """
-    Convert PDF to images with improved handling for large files.
+    Parse a list of output sizes such as "150dpi,800px,200px".
+    
+    A DPI size scales the page like --dpi; a pixel size fits the longer
+    edge of the page into that many pixels.
+    
+    Returns:
+        List of dicts with a label and either dpi or pixels
+    
+    Raises:
+        ValueError: If a size is not valid
+    """
+    sizes = []
+    for part in spec.replace(' ', '').lower().split(','):
+        if not part:
+            continue
+        match = re.fullmatch(r'(\d+)(dpi|px)', part)
+        if not match or int(match.group(1)) < 1:
+            raise ValueError(f"Invalid size: {part!r} (use e.g. 150dpi or 800px)")
+        value = int(match.group(1))
+        label = f"{value}{match.group(2)}"
+        if label not in [size['label'] for size in sizes]:
+            sizes.append({'label': label, 'dpi' if match.group(2) == 'dpi' else 'pixels': value})
+    
+    if not sizes:
+        raise ValueError("No output sizes given")
+    return sizes
+
+
+def get_render_dpi(sizes, width_pt, height_pt):
+    """Get the lowest DPI whose render of a page is at least as large as every requested size"""
+    return max(size['dpi'] if 'dpi' in size else math.ceil(size['pixels'] * 72 / max(width_pt, height_pt))
+               for size in sizes)
+
+
+def get_render_dpis(sizes, page_dimensions, page_numbers):
+    """
+    Get the DPI each page is rendered at to derive the requested sizes from.
+    
+    Every page gets its own DPI, so a small page does not make the large
+    pages of the document render at more pixels than they need.
+    
+    Returns:
+        Dict of page number to DPI, or None when no sizes are requested
+    """
+    if not sizes:
+        return None
+    return {page_num: get_render_dpi(sizes, *page_dimensions[page_num - 1]) for page_num in page_numbers}
+
+
+def get_fit_size(width_pt, height_pt, max_width=None, max_height=None, long_edge=None):
+    """
+    Get the largest (width, height) in pixels of a page that keeps its shape within the pixel limits.
     
     Args:
-        pdf_path: Path to the PDF file
-        output_dir: Output directory for the images
-        dpi: Image resolution in DPI
-        format: Image format (jpg or png)
-        overwrite: Whether to overwrite existing files
-        batch_size: Number of pages to process at once
-        timeout: Timeout per batch in seconds
+        width_pt, height_pt: Page size in points, as rendered
+        max_width, max_height, long_edge: Optional limits in pixels
     """
-    start_time = time.time()
+    scale = min(limit / edge for limit, edge in ((max_width, width_pt), (max_height, height_pt),
+                                                 (long_edge, max(width_pt, height_pt))) if limit)
+    return max(1, round(width_pt * scale)), max(1, round(height_pt * scale))
+
+
+def get_page_sizes(page_dimensions, page_numbers, max_width=None, max_height=None, long_edge=None):
+    """
+    Get the pixel size each page is rendered at to fit the pixel limits.
+    
+    Returns:
+        Dict of page number to (width, height), or None when no limit is set
+        and pages are rendered at the DPI
+    """
+    if not (max_width or max_height or long_edge):
+        return None
+    return {page_num: get_fit_size(*page_dimensions[page_num - 1], max_width, max_height, long_edge)
+            for page_num in page_numbers}
+
+
+def describe_pixel_limits(max_width=None, max_height=None, long_edge=None):
+    limits = [f"{label} {value} px" for label, value in (('width', max_width), ('height', max_height),
+                                                         ('long edge', long_edge)) if value]
+    return "at most " + ", ".join(limits)
+
+
+def describe_render_dpis(page_dpis):
+    lowest, highest = min(page_dpis.values(), default=0), max(page_dpis.values(), default=0)
+    return f"{lowest} DPI" if lowest == highest else f"{lowest}-{highest} DPI depending on the page size"
+
+
+def resize_for_sizes(image, sizes, render_dpi):
+    """
+    Derive every requested size of a page from one render at render_dpi.
+    
+    Sizes are made largest first, each scaled down from the previous one,
+    so small thumbnails do not have to read the full-size page. Sizes larger
+    than the render are not upscaled.
+    
+    Returns:
+        List of (label, image) tuples in the order of sizes
+    """
+    targets = []
+    for size in sizes:
+        if 'dpi' in size:
+            scale = size['dpi'] / render_dpi
+        else:
+            scale = size['pixels'] / max(image.size)
+        scale = min(1.0, scale)
+        targets.append((size['label'], (max(1, round(image.width * scale)), max(1, round(image.height * scale)))))
     
+    from PIL import Image
+    
+    resized = {}
+    source = image
+    for label, target in sorted(targets, key=lambda item: item[1][0] * item[1][1], reverse=True):
+        if target != source.size:
+            source = source.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        resized[label] = source
+    return [(label, resized[label]) for label, _ in targets]
+
+
+def is_valid_image_file(path, format):
+    """Cheap check that an existing output file starts with the right image header"""
+    signatures = IMAGE_SIGNATURES.get(format, (b'',))
     try:
-        # Get poppler path
-        poppler_path = get_poppler_path()
-        
-        # Get PDF information
-        pdf_reader = PdfReader(pdf_path)
-        page_count = len(pdf_reader.pages)
-        page_dimensions = get_page_dimensions(pdf_path)
-        
-        # Get output directory
-        output_directory = get_output_directory(pdf_path, output_dir)
-        
-        # Get file basename without extension for naming
-        pdf_name = Path(pdf_path).stem
-        
-        # Display page dimensions and estimated image sizes
-        display_page_info(page_dimensions, dpi)
-        
-        print(f"\nConverting PDF: {pdf_path}")
-        print(f"Total pages: {page_count}")
-        print(f"Format: {format}, DPI: {dpi}")
-        print(f"Output directory: {output_directory}")
-        if poppler_path:
-            print(f"Using bundled Poppler: {poppler_path}")
+        with open(path, 'rb') as f:
+            header = f.read(max(len(signature) for signature in signatures) or 1)
+    except OSError:
+        return False
+    return len(header) > 0 and header.startswith(signatures)
+
+
+def find_missing_pages(page_numbers, output_directory, pdf_name, format, verify=False, sizes=None, archive=None):
+    """
+    Return the pages from page_numbers whose output image does not exist yet.
+    
+    With verify=True, existing files with a missing or wrong header are
+    treated as missing so they get rendered again. With sizes, a page is
+    missing when any of its sizes is. With an output archive, its members
+    are checked instead of files. With format auto, a page exists when
+    all of its images exist in any of the formats auto picks from.
+    """
+    candidates = AUTO_FORMATS if format == 'auto' else (format,)
+    missing = []
+    for page_num in page_numbers:
+        if not any(page_exists(page_num, output_directory, pdf_name, candidate, verify, sizes, archive)
+                   for candidate in candidates):
+            missing.append(page_num)
+    return missing
+
+
+def page_exists(page_num, output_directory, pdf_name, format, verify=False, sizes=None, archive=None):
+    """Check whether every image of a page exists in one format"""
+    for output_filename in get_output_filenames(pdf_name, page_num, format, sizes):
+        if archive:
+            exists = archive.has_member(output_filename, format if verify else None)
         else:
-            print("Using system Poppler")
-        print(f"Processing in batches of {batch_size} pages")
-        
-        # Process pages in batches to conserve memory
-        for batch_start in range(0, page_count, batch_size):
-            batch_end = min(batch_start + batch_size, page_count)
-            
-            print(f"\nProcessing pages {batch_start + 1}-{batch_end} of {page_count}...")
-              # Process a batch of pages
-            try:
-                # Prepare conversion arguments
-                convert_args = {
-                    'pdf_path': pdf_path,
-                    'dpi': dpi,
-                    'first_page': batch_start + 1,
-                    'last_page': batch_end,
-                    'timeout': timeout
-                }
-                
-                # Add poppler path if available
-                if poppler_path:
-                    convert_args['poppler_path'] = poppler_path
-                
-                images = convert_from_path(**convert_args)
-                
-                # Save each image in the batch
-                for i, image in enumerate(images):
-                    page_num = batch_start + i + 1
-                    output_filename = f"{pdf_name}_{page_num}.{format}"
-                    output_path = output_directory / output_filename
-                    
-                    if os.path.exists(output_path) and not overwrite:
-                        print(f"  Skipping page {page_num}: {output_filename} (already exists)")
-                        continue
-                    
-                    # Save image with appropriate format settings
-                    if format == 'jpg':
-                        image.save(output_path, 'JPEG', quality=95, optimize=True)
-                    else:  # png
-                        image.save(output_path, 'PNG', optimize=True)
-                    
-                    print(f"  Saved page {page_num}: {output_filename}")
-            
-            except Exception as e:
-                print(f"Error processing pages {batch_start + 1}-{batch_end}: {str(e)}")
-                # Continue processing next batch even if this one failed
-        
-        total_time = time.time() - start_time
-        print(f"\nConversion completed in {total_time:.1f} seconds")
-        print(f"Images saved to: {output_directory}")
-        
-    except PDFPageCountError:
-        print("Error: Could not determine the page count of the PDF. The file may be corrupted.")
-        return 1
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        return 1
+            output_path = Path(output_directory) / output_filename
+            exists = os.path.exists(output_path) and (not verify or is_valid_image_file(output_path, format))
+        if not exists:
+            return False
+    return True
+
+
+def group_page_ranges(page_numbers, batch_size, page_bytes=None, max_bytes=None):
+    """
+    Merge sorted page numbers into contiguous (first_page, last_page) ranges.
     
-    return 0
+    Each range holds at most batch_size pages so it maps to one Poppler call.
+    With page_bytes (page number to estimated size) and max_bytes, a range
+    also ends before its pages would add up to more than max_bytes; a page
+    bigger than max_bytes gets a range of its own.
+    """
+    ranges = []
+    range_bytes = 0
+    for page_num in page_numbers:
+        size = page_bytes[page_num] if page_bytes else 0
+        if (ranges and page_num == ranges[-1][1] + 1 and page_num - ranges[-1][0] < batch_size
+                and (max_bytes is None or range_bytes + size <= max_bytes)):
+            ranges[-1] = (ranges[-1][0], page_num)
+            range_bytes += size
+        else:
+            ranges.append((page_num, page_num))
+            range_bytes = size
+    return ranges
 
 
-def main():
-    args = parse_arguments()
+def split_page_ranges(ranges, page_values):
+    """Split (first, last) ranges wherever the pixel size (or DPI) of consecutive pages changes"""
+    split = []
+    for first_page, last_page in ranges:
+        range_start = first_page
+        for page_num in range(first_page + 1, last_page + 1):
+            if page_values[page_num] != page_values[range_start]:
+                split.append((range_start, page_num - 1))
+                range_start = page_num
+        split.append((range_start, last_page))
+    return split
+
+
+def get_page_pixel_size(width_pt, height_pt, dpi):
+    """Get the size in pixels Poppler renders a page at"""
+    return math.ceil(width_pt / 72 * dpi), math.ceil(height_pt / 72 * dpi)
+
+
+def estimate_raster_bytes(width_pt, height_pt, dpi):
+    """Estimate the memory taken by a page rendered as an RGB image"""
+    return int(width_pt / 72 * dpi) * int(height_pt / 72 * dpi) * 3
+
+
+def get_page_batches(pages_to_render, page_dimensions, dpi, batch_size, memory_budget=None, workers=1,
+                     page_sizes=None, page_dpis=None):
+    """
+    Group the pages to render into (first_page, last_page) batches for Poppler.
+    
+    Poppler renders every page of a call at the same pixel size or DPI, so
+    with page_sizes or page_dpis a batch only holds consecutive pages that
+    share them.
+    
+    Args:
+        pages_to_render: Sorted page numbers
+        page_dimensions: (width, height) in points of every page in the PDF
+        dpi: Image resolution in DPI
+        batch_size: Pages per batch when there is no memory budget
+        memory_budget: Optional limit in MB on the page images held at once.
+            It is shared by the workers, and batches are packed by the
+            predicted image size of their pages instead of a page count
+        workers: Number of batches rendered in parallel
+        page_sizes: Optional (width, height) in pixels of each page fitted
+            to pixel limits, from get_page_sizes
+        page_dpis: Optional DPI of each page, from get_render_dpis
+    
+    Returns:
+        List of (first_page, last_page) tuples
+    """
+    if not memory_budget:
+        ranges = group_page_ranges(pages_to_render, batch_size)
+    else:
+        max_bytes = memory_budget * 1024 * 1024 / max(1, workers)
+        if page_sizes:
+            page_bytes = {page_num: page_sizes[page_num][0] * page_sizes[page_num][1] * 3
+                          for page_num in pages_to_render}
+        else:
+            page_bytes = {page_num: estimate_raster_bytes(*page_dimensions[page_num - 1],
+                                                          page_dpis[page_num] if page_dpis else dpi)
+                          for page_num in pages_to_render}
+        for page_num, size in page_bytes.items():
+            if size > max_bytes:
+                print(f"Warning: page {page_num} needs about {size / (1024 * 1024):.0f} MB, "
+                      f"more than its share of the memory budget; it is rendered on its own")
+        ranges = group_page_ranges(pages_to_render, MAX_BUDGET_BATCH_SIZE, page_bytes, max_bytes)
+    
+    for page_values in (page_sizes, page_dpis):
+        if page_values:
+            ranges = split_page_ranges(ranges, page_values)
+    return ranges
+
+
+def get_batch_settings(settings, first_page, page_sizes=None, page_dpis=None):
+    """Get the settings for the batch starting at first_page, with its pixel size or DPI when set per page"""
+    if page_sizes:
+        settings = dict(settings, page_size=page_sizes[first_page])
+    if page_dpis:
+        settings = dict(settings, dpi=page_dpis[first_page])
+    return settings
+
+
+# Longest batch packed by memory budget, so the per-batch timeout stays meaningful
+MAX_BUDGET_BATCH_SIZE = 50
+
+
+def parse_page_ranges(spec):
+    """
+    Parse a page selection such as "1,5,200-210" into (first, last) ranges.
+    
+    "200-" runs to the last page and "-3" starts at page 1; the open end is
+    returned as None.
+    
+    Raises:
+        ValueError: If the selection is not valid
+    """
+    ranges = []
+    for part in spec.replace(' ', '').split(','):
+        if not part:
+            continue
+        try:
+            if '-' in part:
+                first, last = part.split('-')
+                first = int(first) if first else 1
+                last = int(last) if last else None
+            else:
+                first = last = int(part)
+        except ValueError:
+            raise ValueError(f"Invalid page selection: {part!r}")
+        if first < 1 or (last is not None and last < first):
+            raise ValueError(f"Invalid page range: {part!r}")
+        ranges.append((first, last))
+    
+    if not ranges:
+        raise ValueError("The page selection is empty")
+    return ranges
+
+
+def get_selected_pages(pages, page_count):
+    """
+    Get the sorted page numbers picked by a page selection.
+    
+    Args:
+        pages: None for every page, a selection string such as "1,5,200-210",
+            or an iterable of page numbers
+        page_count: Number of pages in the PDF; pages beyond it are left out
+    
+    Raises:
+        ValueError: If the selection is not valid or has no page in the PDF
+    """
+    if pages is None:
+        return list(range(1, page_count + 1))
+    
+    if isinstance(pages, str):
+        selected = set()
+        for first, last in parse_page_ranges(pages):
+            selected.update(range(first, min(page_count if last is None else last, page_count) + 1))
+    else:
+        selected = {int(page_num) for page_num in pages if 1 <= int(page_num) <= page_count}
     
-    return convert_pdf_to_images(
-        args.pdf_path,
-        args.output_dir,
-        args.dpi,
-        args.format,
-        args.overwrite,
-        args.batch_size,
-        args.timeout
-    )
+    if not selected:
+        raise ValueError(f"None of the selected pages are in the PDF ({page_count} pages)")
+    return sorted(selected)
+
+
+def emit_skipped_pages(settings, pages, pages_to_render):
+    """Send a skip event for every selected page left out because its image already exists"""
+    remaining = set(pages_to_render)
+    for page_num in pages:
+        if page_num not in remaining:
+            emit_event(settings, 'skip', pdf=settings.get('pdf_path'), page=page_num, reason='exists')
+
+
+def get_pages_to_render(pages, output_directory, pdf_name, format, overwrite=False, verify_existing=False,
+                        sizes=None, archive=None):
+    """Get the selected page numbers that need rendering, leaving out existing images unless overwriting"""
+    if overwrite:
+        return pages
+    return find_missing_pages(pages, output_directory, pdf_name, format, verify=verify_existing, sizes=sizes,
+                              archive=archive)
+
+
+# Resolution of the render that confirms a page is blank, the gray level
+# below which a pixel counts as ink, the share of ink pixels a blank page
+# may have, and the share of each edge left out, where scanners leave
+# shadows and punch holes
+BLANK_CHECK_DPI = 20
+BLANK_INK_LEVEL = 192
+BLANK_MAX_INK = 0.0005
+BLANK_MARGIN = 0.05
+
+BLANK_PAGE_ACTIONS = ('skip', 'placeholder')
+
+
+def is_blank_image(image):
+    """Check whether a small grayscale render of a page has next to no dark pixels inside its margins"""
+    margin_x = int(image.width * BLANK_MARGIN)
+    margin_y = int(image.height * BLANK_MARGIN)
+    region = image.crop((margin_x, margin_y, image.width - margin_x, image.height - margin_y))
+    ink = sum(region.histogram()[:BLANK_INK_LEVEL])
+    return ink <= BLANK_MAX_INK * region.width * region.height
+
+
+def find_blank_pages(pdf_path, document_info, page_numbers, settings, confirm=False):
+    """
+    Find the pages that come out blank without rendering them at full size.
+    
+    Pages whose content draws nothing and that have no annotations are
+    blank from the metadata alone. With confirm, pages without fonts, such
+    as scans and drawings, are also rendered in grayscale at
+    BLANK_CHECK_DPI and count as blank when next to no pixels are dark.
+    Pages with text are never checked.
+    
+    Args:
+        pdf_path: Path Poppler reads the PDF from
+        document_info: PDFDocumentInfo of the PDF
+        page_numbers: Pages to check
+        settings: Conversion settings, for the Poppler path and timeout
+        confirm: Also check pages without fonts with a low resolution render
+    
+    Returns:
+        Sorted list of blank page numbers
+    """
+    blank = []
+    candidates = []
+    for page_num in page_numbers:
+        page = document_info.pages[page_num - 1]
+        if not page['draws'] and not page['has_annotations']:
+            blank.append(page_num)
+        elif confirm and not page['has_text']:
+            candidates.append(page_num)
+    
+    check_settings = dict(settings, dpi=BLANK_CHECK_DPI, color_mode='gray', page_size=None, crop=None)
+    for first_page, last_page in group_page_ranges(candidates, MAX_BUDGET_BATCH_SIZE):
+        try:
+            for offset, image in enumerate(iter_rendered_pages(pdf_path, first_page, last_page, check_settings)):
+                if is_blank_image(image):
+                    blank.append(first_page + offset)
+        except Exception as e:
+            # The pages are rendered in full instead, where failures are retried page by page
+            print(f"Warning: could not check pages {first_page}-{last_page} for blank pages: {str(e)}")
+    return sorted(blank)
+
+
+def remove_blank_pages(pdf_path, document_info, pages_to_render, settings, action, confirm=False):
+    """
+    Take the blank pages out of the pages to render.
+    
+    Args:
+        action: skip to leave blank pages out (a skip event is sent for
+            each), or placeholder when write_blank_placeholders follows
+        confirm: Confirm pages without fonts with a low resolution render
+    
+    Returns:
+        (pages_to_render, blank_pages) with the blank pages left out of
+        pages_to_render
+    """
+    blank_pages = find_blank_pages(get_render_path(pdf_path), document_info, pages_to_render, settings, confirm)
+    blank_set = set(blank_pages)
+    if action == 'skip':
+        for page_num in blank_pages:
+            emit_event(settings, 'skip', pdf=settings.get('pdf_path'), page=page_num, reason='blank')
+    return [page_num for page_num in pages_to_render if page_num not in blank_set], blank_pages
+
+
+def write_blank_placeholders(blank_pages, document_info, output_directory, pdf_name, settings, page_sizes=None,
+                             page_dpis=None):
+    """
+    Write a white image of each blank page's size instead of rendering it.
+    
+    Returns:
+        List of (page_num, output_filename) tuples
+    """
+    if not blank_pages:
+        return []
+    
+    from PIL import Image
+    
+    mode = {'gray': 'L', 'mono': '1'}.get(settings.get('color_mode'), 'RGB')
+    results = []
+    for page_num in blank_pages:
+        page_settings = get_batch_settings(settings, page_num, page_sizes, page_dpis)
+        if page_sizes:
+            size = page_sizes[page_num]
+        else:
+            size = get_page_pixel_size(*document_info.page_dimensions[page_num - 1], page_settings['dpi'])
+        image = Image.new(mode, size, 'white' if mode == 'RGB' else 255)
+        results.append((page_num, write_page(image, page_num, output_directory, pdf_name, page_settings)))
+    return results
+
+
+def describe_blank_pages(blank_count, action, seconds, metrics):
+    """Summarise the blank page pre-pass, with the render time it saved estimated from the pages rendered"""
+    rendered = metrics.pages - (blank_count if action == 'placeholder' else 0)
+    saved = blank_count * metrics.seconds['render'] / rendered if rendered else 0.0
+    done = 'written as placeholders' if action == 'placeholder' else 'skipped'
+    return (f"Blank pages: {blank_count} {done} (pre-pass {seconds:.1f}s, "
+            f"about {saved:.1f}s of rendering saved)")
+
+
+# PIL save() options per encoder profile and format. "balanced" keeps the
+# long-standing defaults; "fast" skips the optimisation passes, which can
+# cost more than rendering the page; "smallest" spends time on file size.
+ENCODER_PROFILES = {
+    'fast': {
+        'jpg': {'quality': 90, 'optimize': False, 'progressive': False, 'subsampling': '4:2:0'},
+        'png': {'compress_level': 1, 'optimize': False},
+        'tiff': {'compression': 'packbits'},
+    },
+    'balanced': {
+        'jpg': {'quality': 95, 'optimize': True},
+        'png': {'optimize': True},
+        'tiff': {'compression': 'tiff_lzw'},
+    },
+    'smallest': {
+        'jpg': {'quality': 85, 'optimize': True, 'progressive': True, 'subsampling': '4:2:0'},
+        'png': {'optimize': True},
+        'tiff': {'compression': 'tiff_adobe_deflate'},
+    },
+}
+
+# Formats --format auto picks from for each page
+AUTO_FORMATS = ('png', 'jpg')
+
+# Largest channel difference still counted as gray, and the share of
+# mid-tone pixels up to which a gray page is stored as 1-bit
+AUTO_GRAY_TOLERANCE = 12
+AUTO_MONO_MIDTONES = 0.02
+
+# Levels this close to black or white count as ink or paper, and the share of
+# such pixels from which a page is text or line art rather than a photo
+AUTO_EXTREME_LEVELS = 48
+AUTO_TEXT_EXTREMES = 0.75
+
+# pdftoppm options for each --color-mode
+COLOR_MODE_ARGS = {'color': [], 'gray': ['-gray'], 'mono': ['-mono']}
+
+PIL_FORMATS = {'jpg': 'JPEG', 'png': 'PNG', 'tiff': 'TIFF'}
+
+# pdftoppm -tiffcompression names for PIL TIFF compression names
+POPPLER_TIFF_COMPRESSION = {
+    'raw': 'none',
+    'packbits': 'packbits',
+    'tiff_lzw': 'lzw',
+    'tiff_adobe_deflate': 'deflate',
+    'jpeg': 'jpeg',
+}
+
+
+def get_save_options(format, profile='balanced', overrides=None):
+    """
+    Get the PIL format name and save() options for an output format.
+    
+    Args:
+        format: Output format (jpg, png or tiff)
+        profile: Encoder profile name from ENCODER_PROFILES
+        overrides: Optional dict with quality, compress_level, progressive
+            and subsampling values that replace the profile's settings
+    """
+    options = dict(ENCODER_PROFILES[profile][format])
+    for name, value in (overrides or {}).items():
+        if value is None:
+            continue
+        if format == 'jpg' and name in ('quality', 'progressive', 'subsampling'):
+            options[name] = value
+        elif format == 'png' and name == 'compress_level':
+            # optimize=True would force the maximum level
+            options.update(compress_level=value, optimize=False)
+    return PIL_FORMATS[format], options
+
+
+def get_format_save_options(format, profile='balanced', overrides=None):
+    """Get the save() options for a conversion; for format auto, a dict of options per candidate format"""
+    if format == 'auto':
+        return {candidate: get_save_options(candidate, profile, overrides)[1] for candidate in AUTO_FORMATS}
+    return get_save_options(format, profile, overrides)[1]
+
+
+def get_auto_encoding(image):
+    """
+    Pick the output format and image mode for a page from its full-resolution histogram.
+    
+    Black and white pages become 1-bit PNG. Pages whose pixels are mostly
+    close to paper or ink (text and line art, anti-aliased or not) become
+    grayscale or palette PNG, and pages with their tones spread out
+    (photos) become JPEG.
+    
+    Returns:
+        (format, mode) tuple
+    """
+    from PIL import ImageChops
+    
+    if image.mode == '1':
+        return 'png', '1'
+    
+    color = False
+    if image.mode != 'L':
+        image = image.convert('RGB')
+        red, green, blue = image.split()
+        spread = max(ImageChops.difference(red, green).getextrema()[1],
+                     ImageChops.difference(green, blue).getextrema()[1])
+        color = spread > AUTO_GRAY_TOLERANCE
+        if color and image.getcolors(256):
+            return 'png', 'P'
+        image = image.convert('L')
+    
+    histogram = image.histogram()
+    pixels = sum(histogram)
+    extremes = sum(histogram[:AUTO_EXTREME_LEVELS]) + sum(histogram[256 - AUTO_EXTREME_LEVELS:])
+    if extremes < AUTO_TEXT_EXTREMES * pixels:
+        return ('jpg', 'RGB') if color else ('jpg', 'L')
+    if color:
+        return 'png', 'P'
+    if sum(histogram[64:192]) <= AUTO_MONO_MIDTONES * pixels:
+        return 'png', '1'
+    return 'png', 'L'
+
+
+def convert_for_encoding(image, mode):
+    """Convert a rendered page to the mode picked by get_auto_encoding"""
+    from PIL import Image
+    
+    if image.mode == mode:
+        return image
+    if mode == '1':
+        return image.convert('L').convert('1', dither=Image.Dither.NONE)
+    if mode == 'P':
+        return image.convert('RGB').quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+    return image.convert(mode)
+
+
+def encode_image(image, fp, format, save_options=None):
+    """Encode a rendered page into a path or file object"""
+    if save_options is None:
+        save_options = get_save_options(format)[1]
+    image.save(fp, PIL_FORMATS[format], **save_options)
+
+
+def write_file(output_path, data):
+    """Write bytes to a file atomically"""
+    # Write to a temporary name first so an interrupted run never leaves a
+    # truncated image behind under the final name
+    temp_path = f"{output_path}.part"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, output_path)
+
+
+class OutputArchive:
+    """
+    Output sink that collects the page images in one file instead of loose files.
+    
+    Pages are added as they finish, from worker threads, so only the page
+    being written is held in memory. Without overwrite, an existing archive
+    is opened for appending and its members count as existing pages.
+    """
+    
+    # Formats whose archives can be streamed to a pipe
+    streamable = True
+    
+    def __init__(self, target, overwrite=False):
+        self.lock = threading.Lock()
+        self.members = set()
+        self.final_path = None
+        self.uses_stdout = target == '-'
+        if self.uses_stdout:
+            self.path = 'stdout'
+            target = sys.stdout.buffer
+        else:
+            self.path = str(target) if isinstance(target, (str, os.PathLike)) else 'a stream'
+        
+        if not isinstance(target, (str, os.PathLike)):
+            if not self.streamable:
+                raise ValueError(f"{self.name.upper()} output cannot be written to a stream")
+            self.open_stream(target)
+        elif os.path.exists(target) and not overwrite:
+            try:
+                self.open_append(target)
+            except Exception as e:
+                raise RuntimeError(f"Cannot add to {target}: {e}. Use --overwrite to start a new archive")
+        else:
+            # Build a new archive under a temporary name, like loose files
+            self.final_path = target
+            self.open_new(f"{target}.part")
+    
+    def has_member(self, name, verify_format=None):
+        """Whether the archive holds a member, optionally checking its image header"""
+        if name not in self.members:
+            return False
+        if not verify_format:
+            return True
+        signatures = IMAGE_SIGNATURES.get(verify_format, (b'',))
+        with self.lock:
+            header = self.read_header(name, max(len(signature) for signature in signatures) or 1)
+        return len(header) > 0 and header.startswith(signatures)
+    
+    def get_save_options(self, name, save_options):
+        """Encoder options for a member; archives that label their pages add to them"""
+        return save_options
+    
+    def expect(self, names):
+        """Announce the members about to be written, in order"""
+    
+    def skip(self, name):
+        """Announce that an expected member will not be written after all"""
+    
+    def write(self, name, data):
+        with self.lock:
+            self.add(name, data)
+            self.members.add(name)
+    
+    def close(self):
+        with self.lock:
+            self.finish()
+        if self.final_path:
+            os.replace(f"{self.final_path}.part", self.final_path)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ZipOutputArchive(OutputArchive):
+    name = 'zip'
+    
+    def open_new(self, path):
+        # Page images are already compressed, so members are stored as is
+        self.archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED)
+    
+    def open_append(self, path):
+        self.archive = zipfile.ZipFile(path, 'a', zipfile.ZIP_STORED)
+        self.members.update(self.archive.namelist())
+    
+    def open_stream(self, stream):
+        self.archive = zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED)
+    
+    def read_header(self, name, size):
+        with self.archive.open(name) as member:
+            return member.read(size)
+    
+    def add(self, name, data):
+        if name in self.members:
+            # ZIP cannot replace a member in place; the newest copy wins when extracting
+            print(f"Warning: {name} is already in the archive, adding a newer copy")
+        self.archive.writestr(zipfile.ZipInfo(name, date_time=time.localtime()[:6]), data)
+    
+    def finish(self):
+        self.archive.close()
+
+
+class TarOutputArchive(OutputArchive):
+    name = 'tar'
+    
+    # Leading bytes of each existing member kept for header checks
+    HEADER_BYTES = 16
+    
+    def open_new(self, path):
+        self.archive = tarfile.open(path, 'w')
+        self.headers = {}
+    
+    def open_append(self, path):
+        # Members cannot be read from a tar opened for appending, so their headers are read first
+        self.headers = {}
+        with tarfile.open(path, 'r') as archive:
+            for member in archive.getmembers():
+                if member.isfile():
+                    self.headers[member.name] = archive.extractfile(member).read(self.HEADER_BYTES)
+        self.members.update(self.headers)
+        self.archive = tarfile.open(path, 'a')
+    
+    def open_stream(self, stream):
+        self.archive = tarfile.open(fileobj=stream, mode='w|')
+        self.headers = {}
+    
+    def read_header(self, name, size):
+        return self.headers.get(name, b'')[:size]
+    
+    def add(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = time.time()
+        self.archive.addfile(info, io.BytesIO(data))
+    
+    def finish(self):
+        self.archive.close()
+
+
+class TiffOutputArchive(OutputArchive):
+    """
+    Multi-page TIFF with one frame per page.
+    
+    Frames are appended in page order; pages that finish early are held,
+    encoded, until the pages before them arrive. Conversions submit batches
+    at most one per worker ahead (get_submit_window) so this stays bounded
+    by a slow early batch. Each frame's ImageDescription
+    tag holds its page's output filename so an interrupted file can be resumed.
+    """
+    
+    name = 'tiff'
+    streamable = False
+    
+    def open_new(self, path):
+        from PIL import TiffImagePlugin
+        self.writer = TiffImagePlugin.AppendingTiffWriter(path, new=True)
+        self.order = deque()
+        self.pending = {}
+    
+    def open_append(self, path):
+        from PIL import Image, ImageSequence, TiffImagePlugin
+        with Image.open(path) as image:
+            for frame in ImageSequence.Iterator(image):
+                self.members.add(frame.tag_v2.get(270))
+        self.writer = TiffImagePlugin.AppendingTiffWriter(path, new=False)
+        self.order = deque()
+        self.pending = {}
+    
+    def read_header(self, name, size):
+        # Frames were checked while reading their descriptions
+        return b'II*\x00'
+    
+    def get_save_options(self, name, save_options):
+        return dict(save_options or {}, description=name)
+    
+    def expect(self, names):
+        with self.lock:
+            self.order.extend(names)
+    
+    def skip(self, name):
+        with self.lock:
+            if name in self.order:
+                self.order.remove(name)
+            while self.order and self.order[0] in self.pending:
+                self.append_frame(self.pending.pop(self.order.popleft()))
+    
+    def add(self, name, data):
+        self.pending[name] = data
+        while self.order and self.order[0] in self.pending:
+            self.append_frame(self.pending.pop(self.order.popleft()))
+    
+    def append_frame(self, data):
+        self.writer.write(data)
+        self.writer.newFrame()
+    
+    def finish(self):
+        # Pages that never arrived (failed batches) no longer hold up the rest
+        for name in self.order:
+            if name in self.pending:
+                self.append_frame(self.pending.pop(name))
+        for data in self.pending.values():
+            self.append_frame(data)
+        self.writer.close()
+
+
+ARCHIVE_FORMATS = {'zip': ZipOutputArchive, 'tar': TarOutputArchive, 'tiff': TiffOutputArchive}
+
+
+def get_archive_format(target, archive_format=None):
+    """Get the archive format from the option or the file extension; streams default to tar"""
+    if archive_format:
+        return archive_format
+    if not isinstance(target, (str, os.PathLike)) or target == '-':
+        return 'tar'
+    extension = Path(target).suffix.lower().lstrip('.')
+    archive_format = {'tif': 'tiff'}.get(extension, extension)
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Cannot tell the archive format of {target}; use a .zip, .tar or .tiff name "
+                         f"or give the format")
+    return archive_format
+
+
+def open_archive(target, archive_format=None, overwrite=False):
+    """
+    Open an output archive.
+    
+    Args:
+        target: Archive path, "-" for stdout, or a writable binary stream
+        archive_format: zip, tar or tiff (default: from the file extension)
+        overwrite: Start a new archive instead of adding to an existing one
+    
+    Returns:
+        OutputArchive
+    """
+    return ARCHIVE_FORMATS[get_archive_format(target, archive_format)](target, overwrite)
+
+
+def write_output(settings, output_directory, output_filename, data):
+    """Write an encoded page to the output archive, or as a file into the output directory"""
+    archive = settings.get('archive')
+    if archive:
+        archive.write(output_filename, data)
+    else:
+        write_file(Path(output_directory) / output_filename, data)
+
+
+def get_poppler_command(name, poppler_path=None):
+    """Get the command line name of a Poppler tool (pdftoppm, pdfinfo, ...)"""
+    if sys.platform == 'win32':
+        name += '.exe'
+    if poppler_path:
+        return os.path.join(poppler_path, name)
+    return name
+
+
+def get_poppler_process_options(poppler_path=None):
+    """Get the env and startupinfo keyword arguments for starting a Poppler tool"""
+    env = os.environ.copy()
+    if poppler_path:
+        env['LD_LIBRARY_PATH'] = poppler_path + os.pathsep + env.get('LD_LIBRARY_PATH', '')
+    
+    startupinfo = None
+    if sys.platform == 'win32':
+        # Prevent a console window from popping up for every Poppler call
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    
+    return {'env': env, 'startupinfo': startupinfo}
+
+
+def open_poppler_process(args, poppler_path=None, stderr=None):
+    """Start a Poppler tool with its output on a pipe"""
+    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=stderr or subprocess.DEVNULL,
+                            **get_poppler_process_options(poppler_path))
+
+
+def get_pdftoppm_args(pdf_path, first_page, last_page, settings):
+    """
+    Get the pdftoppm command line that writes a page range to stdout as raw PNM images.
+    
+    With settings['crop'], an (x, y, width, height) rectangle in pixels,
+    only that part of each page is rendered.
+    """
+    crop_args = []
+    if settings.get('crop'):
+        x, y, width, height = settings['crop']
+        crop_args = ['-x', str(x), '-y', str(y), '-W', str(width), '-H', str(height)]
+    return [get_poppler_command('pdftoppm', settings.get('poppler_path')),
+            *get_scale_args(settings),
+            '-f', str(first_page),
+            '-l', str(last_page),
+            *crop_args,
+            *COLOR_MODE_ARGS[settings.get('color_mode') or 'color'],
+            str(pdf_path)]
+
+
+def get_scale_args(settings):
+    """Get the pdftoppm arguments that set the rendered page size: the DPI or, for fitted pages, the pixel size"""
+    if settings.get('page_size'):
+        width, height = settings['page_size']
+        return ['-scale-to-x', str(width), '-scale-to-y', str(height)]
+    return ['-r', str(settings['dpi'])]
+
+
+def run_poppler(args, poppler_path=None, timeout=None):
+    """Run a Poppler tool to completion, raising if it fails or times out"""
+    process = open_poppler_process(args, poppler_path, stderr=subprocess.PIPE)
+    try:
+        output, errors = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        from pdf2image.exceptions import PDFPopplerTimeoutError
+        raise PDFPopplerTimeoutError("Run poppler timeout.")
+    
+    if process.returncode != 0:
+        message = errors.decode('utf8', 'ignore').strip()
+        raise RuntimeError(message or f"{Path(args[0]).name} exited with code {process.returncode}")
+    return output
+
+
+def get_poppler_format_args(format, save_options):
+    """
+    Get the pdftoppm arguments that make Poppler encode the output format itself.
+    
+    Returns None when the encoder options cannot be expressed to Poppler.
+    PNG files are written with Poppler's own compression settings.
+    """
+    if format == 'jpg':
+        if save_options.get('subsampling', '4:2:0') != '4:2:0':
+            return None
+        jpeg_options = [f"quality={save_options.get('quality', 75)}"]
+        for name in ('optimize', 'progressive'):
+            if name in save_options:
+                jpeg_options.append(f"{name}={'y' if save_options[name] else 'n'}")
+        return ['-jpeg', '-jpegopt', ','.join(jpeg_options)]
+    if format == 'png':
+        return ['-png']
+    if format == 'tiff':
+        compression = POPPLER_TIFF_COMPRESSION.get(save_options.get('compression', 'raw'))
+        if compression is None:
+            return None
+        return ['-tiff', '-tiffcompression', compression]
+    return None
+
+
+def check_pnm_magic(magic):
+    if magic not in (b'P4', b'P5', b'P6'):
+        raise ValueError(f"Unexpected image header from Poppler: {magic!r}")
+
+
+def get_pnm_field_count(magic):
+    """Number of whitespace separated header fields after the magic; PBM has no maxval"""
+    return 2 if magic == b'P4' else 3
+
+
+def get_pnm_layout(magic, width, height):
+    """Get the PIL mode, raw mode and data size of a binary PNM image"""
+    if magic == b'P4':
+        return '1', '1;I', (width + 7) // 8 * height
+    if magic == b'P5':
+        return 'L', 'L', width * height
+    return 'RGB', 'RGB', width * height * 3
+
+
+def read_pnm_image(stream):
+    """
+    Read one binary PBM/PGM/PPM image from a stream.
+    
+    Returns a PIL image, or None at the end of the stream.
+    """
+    magic = stream.read(2)
+    if len(magic) < 2:
+        return None
+    check_pnm_magic(magic)
+    
+    fields = []
+    token = b''
+    while len(fields) < get_pnm_field_count(magic):
+        char = stream.read(1)
+        if not char:
+            raise ValueError("Truncated image header from Poppler")
+        if char.isspace():
+            if token:
+                fields.append(int(token))
+                token = b''
+        else:
+            token += char
+    
+    from PIL import Image
+    
+    mode, rawmode, size = get_pnm_layout(magic, fields[0], fields[1])
+    data = stream.read(size)
+    if len(data) < size:
+        raise ValueError("Truncated image data from Poppler")
+    return Image.frombytes(mode, (fields[0], fields[1]), data, 'raw', rawmode)
+
+
+def iter_rendered_pages(pdf_path, first_page, last_page, settings):
+    """
+    Render a page range with pdftoppm and yield the pages one at a time.
+    
+    Poppler writes raw images to a pipe that is read page by page, so only
+    the page being handled is held in memory. The pipe also throttles
+    Poppler when the consumer falls behind.
+    
+    Poppler is killed once the time spent waiting on it for the range passes
+    settings['timeout']. The time the consumer takes to handle each page
+    does not count.
+    """
+    poppler_path = settings.get('poppler_path')
+    args = get_pdftoppm_args(pdf_path, first_page, last_page, settings)
+    
+    with tempfile.TemporaryFile() as error_log:
+        process = open_poppler_process(args, poppler_path, stderr=error_log)
+        remaining = settings['timeout']
+        timed_out = threading.Event()
+        
+        def kill():
+            timed_out.set()
+            process.kill()
+        
+        timer = None
+        try:
+            while True:
+                timer = threading.Timer(max(0.0, remaining), kill)
+                started = time.perf_counter()
+                timer.start()
+                image = read_pnm_image(process.stdout)
+                if image is None:
+                    # The timer keeps running while Poppler exits
+                    break
+                timer.cancel()
+                remaining -= time.perf_counter() - started
+                yield image
+            
+            process.wait()
+            if timed_out.is_set():
+                from pdf2image.exceptions import PDFPopplerTimeoutError
+                raise PDFPopplerTimeoutError("Run poppler timeout.")
+            if process.returncode != 0:
+                error_log.seek(0)
+                message = error_log.read().decode('utf8', 'ignore').strip()
+                raise RuntimeError(message or f"pdftoppm exited with code {process.returncode}")
+        finally:
+            if timer:
+                timer.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+
+def write_page(image, page_num, output_directory, pdf_name, settings, render_seconds=0.0):
+    """
+    Save one rendered page and add it to the render cache, returning its filename.
+    
+    With settings['sizes'], every size is derived from the image and saved,
+    and the filenames are returned comma separated. With format auto, the
+    format and colour mode are picked for the page. Downscaling and colour
+    conversion count as encode time.
+    """
+    sizes = settings.get('sizes')
+    format = settings['format']
+    save_options = settings.get('save_options')
+    started = time.perf_counter()
+    mode = None
+    if format == 'auto':
+        format, mode = get_auto_encoding(image)
+        save_options = save_options[format]
+    if sizes:
+        variants = resize_for_sizes(image, sizes, settings['dpi'])
+    else:
+        variants = [(None, image)]
+    
+    archive = settings.get('archive')
+    output_filenames = []
+    encode_seconds = write_seconds = 0.0
+    size = 0
+    for label, variant in variants:
+        output_filename = get_output_filename(pdf_name, page_num, format, label)
+        variant_options = save_options
+        if archive:
+            variant_options = archive.get_save_options(output_filename, save_options)
+        if mode:
+            variant = convert_for_encoding(variant, mode)
+        
+        buffer = io.BytesIO()
+        encode_image(variant, buffer, format, variant_options)
+        encoded = time.perf_counter()
+        write_output(settings, output_directory, output_filename, buffer.getbuffer())
+        written = time.perf_counter()
+        encode_seconds += encoded - started
+        write_seconds += written - encoded
+        started = written
+        size += buffer.tell()
+        output_filenames.append(output_filename)
+    
+    render_cache = settings.get('render_cache')
+    if render_cache and settings.get('sha256') and not sizes:
+        render_cache.store(settings['sha256'], page_num, settings, Path(output_directory) / output_filename)
+    
+    output_filename = ', '.join(output_filenames)
+    emit_event(settings, 'page', pdf=settings.get('pdf_path'), page=page_num, file=output_filename,
+               width=image.width, height=image.height, render_seconds=render_seconds,
+               encode_seconds=encode_seconds, write_seconds=write_seconds, bytes=size)
+    return output_filename
+
+
+def get_direct_format_args(settings):
+    """
+    Get the pdftoppm arguments for writing this conversion's files with Poppler.
+    
+    Returns None when the files must go through PIL: Poppler writes one file
+    per page in one format, so derived sizes, per-page formats and labelled
+    TIFF archive frames cannot be left to it, and it has no 1-bit JPEG.
+    """
+    archive = settings.get('archive')
+    if settings.get('sizes') or (archive and not archive.streamable):
+        return None
+    if settings.get('color_mode') == 'mono' and settings['format'] == 'jpg':
+        return None
+    return get_poppler_format_args(settings['format'], settings.get('save_options') or {})
+
+
+def convert_page_range_direct(pdf_path, first_page, last_page, output_directory, pdf_name, settings, format_args):
+    """
+    Have pdftoppm write the encoded images itself, then move them into place.
+    
+    Poppler writes into a temporary folder inside the output directory so the
+    final step is a rename. No image data passes through PIL.
+    """
+    poppler_path = settings.get('poppler_path')
+    results = []
+    with tempfile.TemporaryDirectory(dir=output_directory, prefix='.pdf_to_image_') as temp_dir:
+        args = [get_poppler_command('pdftoppm', poppler_path),
+                *get_scale_args(settings),
+                '-f', str(first_page),
+                '-l', str(last_page),
+                *COLOR_MODE_ARGS[settings.get('color_mode') or 'color'],
+                *format_args,
+                str(pdf_path),
+                os.path.join(temp_dir, 'page')]
+        
+        started = time.perf_counter()
+        run_poppler(args, poppler_path, settings['timeout'])
+        rendered = sorted(os.listdir(temp_dir))
+        render_seconds = (time.perf_counter() - started) / max(1, len(rendered))
+        
+        for temp_name in rendered:
+            # Poppler names the files page-<zero padded page number>.<ext>
+            page_num = int(Path(temp_name).stem.rsplit('-', 1)[-1])
+            output_filename = get_output_filename(pdf_name, page_num, settings['format'])
+            output_path = Path(output_directory) / output_filename
+            temp_path = os.path.join(temp_dir, temp_name)
+            
+            started = time.perf_counter()
+            size = os.path.getsize(temp_path)
+            if settings.get('archive'):
+                with open(temp_path, 'rb') as f:
+                    settings['archive'].write(output_filename, f.read())
+            else:
+                os.replace(temp_path, output_path)
+            
+            render_cache = settings.get('render_cache')
+            if render_cache and settings.get('sha256'):
+                render_cache.store(settings['sha256'], page_num, settings, output_path)
+            
+            emit_event(settings, 'page', pdf=settings.get('pdf_path'), page=page_num, file=output_filename,
+                       width=None, height=None, render_seconds=render_seconds, encode_seconds=0.0,
+                       write_seconds=time.perf_counter() - started, bytes=size)
+            results.append((page_num, output_filename))
+    
+    return results
+
+
+class PageRangeError(Exception):
+    """A page range failed after some of its pages were already saved"""
+    
+    def __init__(self, error, results):
+        super().__init__(str(error))
+        self.error = error
+        self.results = results
+
+
+def convert_page_range_isolated(pdf_path, first_page, last_page, output_directory, pdf_name, settings):
+    """
+    Convert a page range like convert_page_range, splitting it up when it fails.
+    
+    A failed or timed out range is halved and each half is retried with a
+    Poppler call and timeout of its own (settings['page_timeout'] seconds
+    per page when set), down to single pages, so a bad page only costs
+    itself. Pages that fail on their own are returned as failures instead
+    of raising; the rest of the range is still converted. Errors from the
+    file system are not page specific and are raised as before.
+    
+    Returns:
+        (results, failures) tuple: results as from convert_page_range, and a
+        list of dicts with the pdf, page, error and whether it timed out
+    """
+    try:
+        results = convert_page_range(pdf_path, first_page, last_page, output_directory, pdf_name, settings)
+    except OSError:
+        raise
+    except PageRangeError as e:
+        error, results = e.error, e.results
+    except Exception as e:
+        error, results = e, []
+    else:
+        if len(results) == last_page - first_page + 1:
+            return results, []
+        # pdf2image returns the pages Poppler rendered before it failed without an error
+        error = RuntimeError("Poppler stopped before the end of the range")
+    
+    # Pages saved before the failure are kept
+    first_failed = results[-1][0] + 1 if results else first_page
+    if first_failed > last_page:
+        # Poppler failed after producing every page
+        return results, []
+    if first_failed == last_page:
+        print(f"  Page {first_failed} failed: {str(error)}")
+        emit_event(settings, 'error', pdf=settings.get('pdf_path'), first_page=first_failed, last_page=first_failed,
+                   message=str(error))
+        archive = settings.get('archive')
+        if archive:
+            for output_filename in get_output_filenames(pdf_name, first_failed, settings['format'],
+                                                        settings.get('sizes')):
+                archive.skip(output_filename)
+        from pdf2image.exceptions import PDFPopplerTimeoutError
+        return results, [{'pdf': settings.get('pdf_path'), 'page': first_failed, 'error': str(error),
+                          'timed_out': isinstance(error, PDFPopplerTimeoutError)}]
+    
+    print(f"  Pages {first_failed}-{last_page} failed ({str(error)}), retrying in smaller ranges")
+    failures = []
+    middle = (first_failed + last_page) // 2
+    for range_first, range_last in ((first_failed, middle), (middle + 1, last_page)):
+        range_settings = settings
+        if settings.get('page_timeout'):
+            range_settings = dict(settings, timeout=min(settings['timeout'],
+                                                        settings['page_timeout'] * (range_last - range_first + 1)))
+        range_results, range_failures = convert_page_range_isolated(pdf_path, range_first, range_last,
+                                                                    output_directory, pdf_name, range_settings)
+        results += range_results
+        failures += range_failures
+    return results, failures
+
+
+def write_failure_report(path, failures):
+    """Write the pages that could not be converted to a JSON file"""
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'failed_pages': len(failures),
+        'failures': failures
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+
+def convert_page_range(pdf_path, first_page, last_page, output_directory, pdf_name, settings):
+    """
+    Render pages first_page..last_page with a single Poppler call and save them.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        first_page: First page of the range (1-based)
+        last_page: Last page of the range (inclusive)
+        output_directory: Directory the images are written to
+        pdf_name: Base name used for the output files
+        settings: Dict with dpi, format, timeout, poppler_path, stream,
+            direct, save_options, optionally a page_size (width, height)
+            in pixels replacing dpi, an on_event callback, sizes
+            to derive from each render, an output archive and, when caching
+            renders, render_cache and the PDF's sha256
+    
+    Returns:
+        List of (page_num, output_filename) tuples in page order
+    """
+    if settings.get('direct'):
+        format_args = get_direct_format_args(settings)
+        if format_args:
+            return convert_page_range_direct(pdf_path, first_page, last_page, output_directory, pdf_name,
+                                             settings, format_args)
+    
+    # pdf2image has no 1-bit output, so mono pages are read from Poppler directly
+    if settings.get('stream') or settings.get('color_mode') == 'mono':
+        # Encode each page as soon as Poppler has produced it
+        results = []
+        pages = iter_rendered_pages(pdf_path, first_page, last_page, settings)
+        try:
+            for page_num in range(first_page, last_page + 1):
+                started = time.perf_counter()
+                image = next(pages, None)
+                if image is None:
+                    break
+                output_filename = write_page(image, page_num, output_directory, pdf_name, settings,
+                                             time.perf_counter() - started)
+                image.close()
+                results.append((page_num, output_filename))
+        except Exception as e:
+            if results:
+                raise PageRangeError(e, results) from e
+            raise
+        return results
+    
+    # Prepare conversion arguments
+    convert_args = {
+        'pdf_path': pdf_path,
+        'dpi': settings['dpi'],
+        'first_page': first_page,
+        'last_page': last_page,
+        'timeout': settings['timeout']
+    }
+    
+    # Add poppler path if available
+    if settings.get('poppler_path'):
+        convert_args['poppler_path'] = settings['poppler_path']
+    if settings.get('page_size'):
+        convert_args['size'] = tuple(settings['page_size'])
+    if settings.get('color_mode') == 'gray':
+        convert_args['grayscale'] = True
+    
+    from pdf2image import convert_from_path
+    
+    started = time.perf_counter()
+    images = convert_from_path(**convert_args)
+    # Poppler renders the batch in one go, so each page gets an equal share
+    render_seconds = (time.perf_counter() - started) / max(1, len(images))
+    
+    results = []
+    for i, image in enumerate(images):
+        page_num = first_page + i
+        output_filename = write_page(image, page_num, output_directory, pdf_name, settings, render_seconds)
+        results.append((page_num, output_filename))
+    
+    return results
+
+
+def print_option_notes(sizes, direct, render_cache, format, save_options, archive=None, color_mode='color'):
+    """Explain options that do not apply to this conversion"""
+    if direct and sizes:
+        print("Note: --direct does not apply with --sizes, pages are encoded with PIL")
+    elif direct and format == 'auto':
+        print("Note: --direct does not apply with --format auto, pages are encoded with PIL")
+    elif direct and format == 'jpg' and color_mode == 'mono':
+        print("Note: Poppler cannot write 1-bit JPEG, pages are encoded with PIL")
+    elif direct and archive and not archive.streamable:
+        print("Note: --direct does not apply to multi-page TIFF output, pages are encoded with PIL")
+    elif direct and not get_poppler_format_args(format, save_options):
+        print("Note: Poppler cannot apply these encoder options, pages are encoded with PIL")
+    if render_cache and sizes:
+        print("Note: the render cache is not used with --sizes")
+    elif render_cache and format == 'auto':
+        print("Note: the render cache is not used with --format auto")
+    elif render_cache and archive:
+        print("Note: the render cache is not used when writing an archive")
+
+
+def convert_into_archive(convert, options):
+    """
+    Open the archive named in options['archive'], run a conversion into it and close it.
+    
+    When the archive goes to stdout, progress messages go to stderr instead.
+    """
+    try:
+        archive_format = get_archive_format(options['archive'], options['archive_format'])
+        if archive_format == 'tiff' and options['sizes']:
+            raise ValueError("--sizes cannot be combined with a multi-page TIFF")
+        archive = open_archive(options['archive'], archive_format, options['overwrite'])
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"Error: {str(e)}")
+        return 1
+    
+    if archive_format == 'tiff':
+        options['format'] = 'tiff'
+    with archive, redirect_stdout(sys.stderr) if archive.uses_stdout else nullcontext():
+        return convert(**dict(options, archive=archive))
+
+
+def convert_from_data(convert, options):
+    """Run a conversion of a PDF given as data, removing its temporary copy afterwards"""
+    with PDFInput(options['pdf_path'], options['name']) as pdf_input:
+        return convert(**dict(options, pdf_path=pdf_input))
+
+
+def get_submit_window(archive, workers):
+    """
+    Get how many batches may run ahead of the one being waited on, or None for no limit.
+    
+    A multi-page TIFF takes its pages in order and holds the ones that arrive
+    early in memory, so with one it is kept to about a batch per worker.
+    """
+    if archive and not archive.streamable:
+        return max(1, workers)
+    return None
+
+
+def submit_in_order(executor, function, batch_args, window=None):
+    """
+    Submit a call per batch and yield the futures in batch order.
+    
+    Without a window every batch is submitted before the first future is
+    yielded. With one, batches are submitted as the caller takes the
+    futures, at most `window` ahead of the oldest one not yet taken.
+    """
+    pending = deque()
+    for args in batch_args:
+        pending.append(executor.submit(function, *args))
+        if window and len(pending) >= window:
+            yield pending.popleft()
+    yield from pending
+
+
+def print_batch_plan(batch_size, workers, memory_budget=None):
+    if memory_budget:
+        print(f"Processing in batches sized to a {memory_budget} MB memory budget with {workers} worker(s)")
+    else:
+        print(f"Processing in batches of {batch_size} pages with {workers} worker(s)")
+
+
+def convert_pdf_to_images(pdf_path, output_dir=None, dpi=150, format='jpg', overwrite=False, batch_size=5, timeout=300,
+                          workers=1, verify_existing=False, stream=False, use_cache=True, render_cache=None,
+                          on_event=None, profile='balanced', encoder_options=None, direct=False, memory_budget=None,
+                          pages=None, sizes=None, archive=None, archive_format=None, color_mode='color', name=None,
+                          page_timeout=None, failure_report=None, tiles=None, tile_size=256, max_width=None,
+                          max_height=None, long_edge=None, blank_pages=None, confirm_blank=False):
+    """
+    Convert PDF to images with improved handling for large files.
+    
+    Args:
+        pdf_path: Path to the PDF file, or the PDF itself as bytes, an mmap
+            or a binary file object
+        output_dir: Output directory for the images (default: next to the
+            PDF, or the current directory for a PDF given as data)
+        dpi: Image resolution in DPI
+        format: Image format (jpg, png or tiff), or auto to pick a 1-bit,
+            grayscale or palette PNG or a JPEG for each page from its content
+        overwrite: Whether to overwrite existing files
+        batch_size: Number of pages to process at once
+        timeout: Timeout per batch in seconds
+        workers: Number of batches rendered in parallel
+        verify_existing: Re-render existing images that fail a header check
+        stream: Stream pages from Poppler one at a time instead of whole batches
+        use_cache: Reuse PDF metadata cached on disk by earlier runs
+        render_cache: Optional RenderCache to reuse previously rendered pages
+        on_event: Optional callback receiving a dict for every conversion
+            event (parse, page, skip, error, done); called from worker threads
+        profile: Encoder profile (fast, balanced or smallest)
+        encoder_options: Optional dict of quality, compress_level,
+            progressive and subsampling values overriding the profile
+        direct: Let Poppler encode the images instead of PIL where the
+            encoder options allow it
+        memory_budget: Optional limit in MB on the page images held in memory
+            at once; batches are sized from the page dimensions to fit it
+        pages: Optional page selection, either a string such as
+            "1,5,200-210" or a list of page numbers (default: every page)
+        sizes: Optional output sizes such as "150dpi,800px,200px" (or the
+            list from parse_sizes). Each page is rendered once, at the DPI
+            the largest size needs, and the other sizes are scaled down from
+            it; dpi is ignored and the files are named [pdf_name]_[page]_[size]
+        archive: Optional path of a ZIP, TAR or multi-page TIFF to write the
+            pages into instead of loose files, "-" to stream a TAR to stdout,
+            or a writable binary stream. Without overwrite, an existing
+            archive is added to and its members are skipped
+        archive_format: zip, tar or tiff when the archive path does not
+            tell (default: from the extension, tar for streams)
+        color_mode: Have Poppler render in color, gray or mono (1-bit)
+        name: Base name for the image files of a PDF given as data
+            (default: the file object's name, or "document")
+        page_timeout: Seconds per page allowed when a failed batch is
+            retried in smaller ranges (default: timeout, for every range)
+        failure_report: Optional path of a JSON file listing the pages that
+            could not be converted, written at the end of the run
+        tiles: Render each page in regions into a tile pyramid (deepzoom or
+            xyz) or a striped TIFF (tiff) instead of one image, for pages too
+            large to hold in memory; see pdf_to_image_tiles
+        tile_size: Tile edge in pixels for deepzoom and xyz
+        max_width, max_height, long_edge: Optional limits in pixels. Each
+            page is rendered straight at the largest size within them,
+            computed from its own dimensions, instead of at dpi
+        blank_pages: Find blank pages before rendering, from the page
+            metadata, and skip them ("skip") or write a white image of the
+            page's size for each ("placeholder") without rendering it
+        confirm_blank: Also check pages without fonts, such as scans, for
+            blank pages with a low resolution render
+    
+    Returns:
+        0 if every selected page was converted, 1 if the PDF could not be
+        read or any page failed
+    """
+    if not isinstance(pdf_path, (str, os.PathLike, PDFInput)):
+        return convert_from_data(convert_pdf_to_images, dict(locals()))
+    if sizes and (max_width or max_height or long_edge):
+        print("Error: sizes cannot be combined with pixel limits")
+        return 1
+    if tiles:
+        if sizes or archive is not None or max_width or max_height or long_edge or blank_pages:
+            print("Error: tiled output cannot be combined with sizes, pixel limits, blank page handling "
+                  "or an archive")
+            return 1
+        from pdf_to_image_tiles import convert_pdf_to_tiles
+        return convert_pdf_to_tiles(pdf_path, output_dir, dpi=dpi, format=format, overwrite=overwrite,
+                                    timeout=timeout, workers=workers, use_cache=use_cache, on_event=on_event,
+                                    profile=profile, encoder_options=encoder_options, pages=pages,
+                                    color_mode=color_mode, layout=tiles, tile_size=tile_size)
+    if archive is not None and not isinstance(archive, OutputArchive):
+        return convert_into_archive(convert_pdf_to_images, dict(locals()))
+    
+    start_time = time.time()
+    metrics = MetricsCollector(on_event)
+    
+    try:
+        # Get poppler path
+        poppler_path = get_poppler_path()
+        
+        # Get PDF information
+        started = time.perf_counter()
+        document_info = load_document_info(pdf_path, use_cache)
+        page_count = document_info.page_count
+        metrics({'event': 'parse', 'time': time.time(), 'pdf': str(pdf_path), 'pages': page_count,
+                 'seconds': time.perf_counter() - started})
+        page_dimensions = document_info.page_dimensions
+        selected_pages = get_selected_pages(pages, page_count)
+        sizes = parse_sizes(sizes) if isinstance(sizes, str) else sizes
+        # Render each page once, large enough for every size
+        page_dpis = get_render_dpis(sizes, page_dimensions, selected_pages)
+        page_sizes = get_page_sizes(page_dimensions, range(1, page_count + 1), max_width, max_height, long_edge)
+        
+        # Get output directory
+        output_directory = get_output_directory(pdf_path, output_dir)
+        
+        # Get file basename without extension for naming
+        pdf_name = get_pdf_name(pdf_path)
+        
+        # Display page dimensions and estimated image sizes
+        display_page_info(page_dimensions, dpi, page_sizes, page_dpis)
+        
+        print(f"\nConverting PDF: {pdf_path}")
+        print(f"Total pages: {page_count}")
+        if len(selected_pages) < page_count:
+            print(f"Selected pages: {len(selected_pages)}")
+        if page_sizes:
+            print(f"Format: {format}, size: {describe_pixel_limits(max_width, max_height, long_edge)}, "
+                  f"encoder profile: {profile}")
+        elif sizes:
+            print(f"Format: {format}, encoder profile: {profile}")
+        else:
+            print(f"Format: {format}, DPI: {dpi}, encoder profile: {profile}")
+        if color_mode != 'color':
+            print(f"Colour mode: {color_mode}")
+        if sizes:
+            print(f"Sizes: {', '.join(size['label'] for size in sizes)} "
+                  f"(rendered once at {describe_render_dpis(page_dpis)})")
+        if archive:
+            print(f"Output archive: {archive.path}")
+        else:
+            print(f"Output directory: {output_directory}")
+        if poppler_path:
+            print(f"Using bundled Poppler: {poppler_path}")
+        else:
+            print("Using system Poppler")
+        print_batch_plan(batch_size, workers, memory_budget)
+        
+        save_options = get_format_save_options(format, profile, encoder_options)
+        print_option_notes(sizes, direct, render_cache, format, save_options, archive, color_mode)
+        if sizes or archive or format == 'auto':
+            render_cache = None
+        
+        settings = {
+            'dpi': dpi,
+            'format': format,
+            'timeout': timeout,
+            'poppler_path': poppler_path,
+            'stream': stream,
+            'direct': direct,
+            'save_options': save_options,
+            'color_mode': color_mode,
+            'pixel_limits': [max_width, max_height, long_edge] if page_sizes else None,
+            'sizes': sizes,
+            'archive': archive,
+            'page_timeout': page_timeout,
+            'pdf_path': str(pdf_path),
+            'on_event': metrics
+        }
+        
+        # Work out which pages still need rendering before starting Poppler
+        pages_to_render = get_pages_to_render(selected_pages, output_directory, pdf_name, format, overwrite,
+                                              verify_existing, sizes, archive)
+        skipped = len(selected_pages) - len(pages_to_render)
+        if skipped:
+            print(f"Skipping {skipped} of {len(selected_pages)} pages (already exist)")
+            emit_skipped_pages(settings, selected_pages, pages_to_render)
+        
+        blank_page_numbers = []
+        if blank_pages:
+            # Blank pages are found from the metadata before any full render
+            started = time.perf_counter()
+            pages_to_render, blank_page_numbers = remove_blank_pages(pdf_path, document_info, pages_to_render,
+                                                                     settings, blank_pages, confirm_blank)
+            blank_seconds = time.perf_counter() - started
+        
+        if render_cache:
+            settings['render_cache'] = render_cache
+            settings['sha256'] = document_info.sha256 or get_file_digest(pdf_path, use_cache=False)
+            pages_to_render = render_cache.restore_pages(settings['sha256'], pages_to_render, output_directory,
+                                                         pdf_name, settings)
+        
+        # Each batch is rendered by its own pdftoppm process; the pool keeps
+        # up to `workers` of them running while results are reported in order
+        batches = get_page_batches(pages_to_render, page_dimensions, dpi, batch_size, memory_budget, workers,
+                                   page_sizes, page_dpis)
+        pages_rendered = 0
+        placeholder_pages = blank_page_numbers if blank_pages == 'placeholder' else []
+        if archive:
+            archive.expect([get_output_filename(pdf_name, page_num, format)
+                            for page_num in sorted(pages_to_render + placeholder_pages)])
+        for page_num, output_filename in write_blank_placeholders(placeholder_pages, document_info, output_directory,
+                                                                  pdf_name, settings, page_sizes, page_dpis):
+            print(f"  Blank page {page_num}: {output_filename} (placeholder)")
+        
+        render_path = get_render_path(pdf_path) if batches else pdf_path
+        failures = []
+        failed_batches = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            batch_args = [(render_path, first_page, last_page, output_directory, pdf_name,
+                           get_batch_settings(settings, first_page, page_sizes, page_dpis))
+                          for first_page, last_page in batches]
+            futures = submit_in_order(executor, convert_page_range_isolated, batch_args,
+                                      get_submit_window(archive, workers))
+            
+            for (first_page, last_page), future in zip(batches, futures):
+                print(f"\nProcessing pages {first_page}-{last_page} of {page_count}...")
+                try:
+                    results, batch_failures = future.result()
+                    failures += batch_failures
+                except Exception as e:
+                    print(f"Error processing pages {first_page}-{last_page}: {str(e)}")
+                    emit_event(settings, 'error', pdf=settings['pdf_path'], first_page=first_page,
+                               last_page=last_page, message=str(e))
+                    failed_batches += 1
+                    # Continue processing next batch even if this one failed
+                    continue
+                
+                pages_rendered += len(results)
+                for page_num, output_filename in results:
+                    print(f"  Saved page {page_num}: {output_filename}")
+        
+        total_time = time.time() - start_time
+        emit_event(settings, 'done', pdf=settings['pdf_path'], pages=pages_rendered, seconds=total_time)
+        print(f"\nConversion completed in {total_time:.1f} seconds")
+        if total_time > 0:
+            print(f"Throughput: {pages_rendered / total_time:.2f} pages/sec")
+        print(metrics.summary())
+        if render_cache:
+            print(render_cache.summary())
+        if blank_pages:
+            print(describe_blank_pages(len(blank_page_numbers), blank_pages, blank_seconds, metrics))
+        if failures:
+            print(f"Failed pages: {', '.join(str(failure['page']) for failure in failures)}")
+        if failure_report:
+            write_failure_report(failure_report, failures)
+        print(f"Images saved to: {archive.path if archive else output_directory}")
+        if failures or failed_batches:
+            return 1
+        
+    except Exception as e:
+        from pdf2image.exceptions import PDFPageCountError
+        if isinstance(e, PDFPageCountError):
+            print("Error: Could not determine the page count of the PDF. The file may be corrupted.")
+        else:
+            print(f"Error: {str(e)}")
+        return 1
+    
+    return 0
+
+
+def convert_pdfs_to_images(pdf_paths, output_dir=None, dpi=150, format='jpg', overwrite=False, batch_size=5,
+                           timeout=300, workers=1, verify_existing=False, stream=False, use_cache=True,
+                           render_cache=None, on_event=None, profile='balanced', encoder_options=None,
+                           direct=False, memory_budget=None, pages=None, sizes=None, archive=None,
+                           archive_format=None, color_mode='color', page_timeout=None, failure_report=None,
+                           tiles=None, tile_size=256, max_width=None, max_height=None, long_edge=None,
+                           blank_pages=None, confirm_blank=False):
+    """
+    Convert several PDFs with one shared pool of rendering workers.
+    
+    The batches of every document go onto a single work queue, so workers
+    move on to the next document's pages instead of idling while a large
+    file finishes. Takes the same options as convert_pdf_to_images.
+    
+    Returns:
+        0 if every document converted, 1 if any of them failed
+    """
+    if tiles:
+        # Tiled pages bring their own pool of region workers, so documents go one at a time
+        options = dict(locals())
+        del options['pdf_paths']
+        return max([convert_pdf_to_images(pdf_path, **options) for pdf_path in pdf_paths] or [0])
+    if archive is not None and not isinstance(archive, OutputArchive):
+        return convert_into_archive(convert_pdfs_to_images, dict(locals()))
+    sizes = parse_sizes(sizes) if isinstance(sizes, str) else sizes
+    pixel_limits = [max_width, max_height, long_edge] if max_width or max_height or long_edge else None
+    if sizes and pixel_limits:
+        print("Error: sizes cannot be combined with pixel limits")
+        return 1
+    
+    start_time = time.time()
+    metrics = MetricsCollector(on_event)
+    poppler_path = get_poppler_path()
+    settings = {
+        'dpi': dpi,
+        'format': format,
+        'timeout': timeout,
+        'poppler_path': poppler_path,
+        'stream': stream,
+        'direct': direct,
+        'save_options': get_format_save_options(format, profile, encoder_options),
+        'color_mode': color_mode,
+        'pixel_limits': pixel_limits,
+        'page_timeout': page_timeout,
+        'on_event': metrics
+    }
+    
+    print(f"Converting {len(pdf_paths)} PDF file(s)")
+    if pixel_limits:
+        print(f"Format: {format}, size: {describe_pixel_limits(*pixel_limits)}, encoder profile: {profile}")
+    else:
+        print(f"Format: {format}, DPI: {dpi}, encoder profile: {profile}")
+    if color_mode != 'color':
+        print(f"Colour mode: {color_mode}")
+    if poppler_path:
+        print(f"Using bundled Poppler: {poppler_path}")
+    else:
+        print("Using system Poppler")
+    if sizes:
+        print(f"Sizes: {', '.join(size['label'] for size in sizes)} (each page rendered once)")
+    print_batch_plan(batch_size, workers, memory_budget)
+    if archive:
+        print(f"Output archive: {archive.path}")
+    print_option_notes(sizes, direct, render_cache, format, settings['save_options'], archive, color_mode)
+    if sizes or archive or format == 'auto':
+        render_cache = None
+    settings['sizes'] = sizes
+    settings['archive'] = archive
+    
+    def timed_convert(*args):
+        batch_start = time.time()
+        results, failures = convert_page_range_isolated(*args)
+        return results, failures, batch_start, time.time()
+    
+    exit_code = 0
+    total_pages = 0
+    documents = []
+    failures = []
+    blank_count = 0
+    blank_seconds = 0.0
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # Queue the batches of every document before waiting on any of them
+        for pdf_path in pdf_paths:
+            try:
+                started = time.perf_counter()
+                document_info = load_document_info(pdf_path, use_cache)
+                page_count = document_info.page_count
+                metrics({'event': 'parse', 'time': time.time(), 'pdf': str(pdf_path), 'pages': page_count,
+                         'seconds': time.perf_counter() - started})
+                output_directory = get_output_directory(pdf_path, output_dir)
+                pdf_name = Path(pdf_path).stem
+                selected_pages = get_selected_pages(pages, page_count)
+                pages_to_render = get_pages_to_render(selected_pages, output_directory, pdf_name, format,
+                                                      overwrite, verify_existing, sizes, archive)
+                document_settings = dict(settings, pdf_path=str(pdf_path))
+                page_dpis = get_render_dpis(sizes, document_info.page_dimensions, selected_pages)
+                page_sizes = get_page_sizes(document_info.page_dimensions, selected_pages, max_width, max_height,
+                                            long_edge)
+                emit_skipped_pages(document_settings, selected_pages, pages_to_render)
+                pages_missing = len(pages_to_render)
+                blank_page_numbers = []
+                if blank_pages:
+                    started = time.perf_counter()
+                    pages_to_render, blank_page_numbers = remove_blank_pages(pdf_path, document_info,
+                                                                             pages_to_render, document_settings,
+                                                                             blank_pages, confirm_blank)
+                    blank_seconds += time.perf_counter() - started
+                    blank_count += len(blank_page_numbers)
+                if render_cache:
+                    document_settings['render_cache'] = render_cache
+                    document_settings['sha256'] = (document_info.sha256
+                                                   or get_file_digest(pdf_path, use_cache=False))
+                    pages_to_render = render_cache.restore_pages(document_settings['sha256'], pages_to_render,
+                                                                 output_directory, pdf_name, document_settings)
+            except Exception as e:
+                print(f"Error reading {pdf_path}: {str(e)}")
+                exit_code = 1
+                continue
+            
+            batches = get_page_batches(pages_to_render, document_info.page_dimensions, document_settings['dpi'],
+                                       batch_size, memory_budget, workers, page_sizes, page_dpis)
+            placeholder_pages = blank_page_numbers if blank_pages == 'placeholder' else []
+            if archive:
+                archive.expect([get_output_filename(pdf_name, page_num, format)
+                                for page_num in sorted(pages_to_render + placeholder_pages)])
+            try:
+                write_blank_placeholders(placeholder_pages, document_info, output_directory, pdf_name,
+                                         document_settings, page_sizes, page_dpis)
+            except OSError as e:
+                print(f"Error writing blank page placeholders for {pdf_path}: {str(e)}")
+                exit_code = 1
+            batch_args = [(pdf_path, first_page, last_page, output_directory, pdf_name,
+                           get_batch_settings(document_settings, first_page, page_sizes, page_dpis))
+                          for first_page, last_page in batches]
+            window = get_submit_window(archive, workers)
+            futures = submit_in_order(executor, timed_convert, batch_args, window)
+            if not window:
+                # Queue every batch now so workers move straight on to the next document
+                futures = list(futures)
+            documents.append((pdf_path, len(selected_pages), pages_missing, len(blank_page_numbers), batches,
+                              futures))
+        
+        print("\nPer-file summary:")
+        for pdf_path, pages_selected, pages_missing, pages_blank, batches, futures in documents:
+            pages_rendered = 0
+            failed_batches = 0
+            started = []
+            finished = []
+            for (first_page, last_page), future in zip(batches, futures):
+                try:
+                    results, batch_failures, batch_start, batch_end = future.result()
+                    failures += batch_failures
+                    failed_batches += bool(batch_failures)
+                except Exception as e:
+                    print(f"  Error processing {pdf_path} pages {first_page}-{last_page}: {str(e)}")
+                    emit_event(settings, 'error', pdf=str(pdf_path), first_page=first_page, last_page=last_page,
+                               message=str(e))
+                    failed_batches += 1
+                    continue
+                pages_rendered += len(results)
+                started.append(batch_start)
+                finished.append(batch_end)
+            
+            total_pages += pages_rendered
+            emit_event(settings, 'done', pdf=str(pdf_path), pages=pages_rendered,
+                       seconds=max(finished) - min(started) if started else 0.0)
+            skipped = pages_selected - pages_missing
+            cached = pages_missing - pages_blank - sum(last - first + 1 for first, last in batches)
+            summary = f"  {pdf_path}: {pages_rendered} of {pages_selected} pages rendered"
+            if skipped:
+                summary += f", {skipped} skipped"
+            if pages_blank:
+                summary += f", {pages_blank} blank"
+            if cached:
+                summary += f", {cached} from cache"
+            if started:
+                elapsed = max(finished) - min(started)
+                if elapsed > 0:
+                    summary += f" in {elapsed:.1f}s ({pages_rendered / elapsed:.2f} pages/sec)"
+            print(summary)
+            if failed_batches:
+                exit_code = 1
+    
+    total_time = time.time() - start_time
+    print(f"\nConverted {total_pages} pages from {len(documents)} file(s) in {total_time:.1f} seconds")
+    if total_time > 0:
+        print(f"Throughput: {total_pages / total_time:.2f} pages/sec")
+    print(metrics.summary())
+    if render_cache:
+        print(render_cache.summary())
+    if blank_pages:
+        print(describe_blank_pages(blank_count, blank_pages, blank_seconds, metrics))
+    if failures:
+        print(f"Failed pages: {len(failures)}")
+    if failure_report:
+        write_failure_report(failure_report, failures)
+    
+    return exit_code
+
+
+def run_conversion(args, inputs, pdf_paths, render_cache=None, on_event=None):
+    """Run the conversion selected on the command line"""
+    options = {
+        'output_dir': args.output_dir,
+        'dpi': args.dpi,
+        'format': args.format,
+        'overwrite': args.overwrite,
+        'batch_size': args.batch_size,
+        'timeout': args.timeout,
+        'workers': args.workers,
+        'verify_existing': args.verify_existing,
+        'stream': args.stream,
+        'use_cache': not args.no_cache,
+        'render_cache': render_cache,
+        'on_event': on_event,
+        'direct': args.direct,
+        'memory_budget': args.memory_budget,
+        'pages': args.pages,
+        'sizes': args.sizes,
+        'archive': args.archive,
+        'archive_format': args.archive_format,
+        'color_mode': args.color_mode,
+        'page_timeout': args.page_timeout,
+        'failure_report': args.failure_report,
+        'tiles': args.tiles,
+        'tile_size': args.tile_size,
+        'max_width': args.max_width,
+        'max_height': args.max_height,
+        'long_edge': args.long_edge,
+        'blank_pages': args.blank_pages,
+        'confirm_blank': args.confirm_blank,
+        'profile': args.profile,
+        'encoder_options': {
+            'quality': args.quality,
+            'compress_level': args.png_compress_level,
+            'progressive': args.progressive,
+            'subsampling': args.subsampling
+        }
+    }
+    
+    # A single explicitly named file keeps the detailed per-page report
+    if len(inputs) == 1 and pdf_paths == inputs:
+        return convert_pdf_to_images(pdf_paths[0], **options)
+    
+    return convert_pdfs_to_images(pdf_paths, **options)
+
+
+def main():
+    # Subcommands are implemented in their own modules
+    if sys.argv[1:2] == ['benchmark']:
+        from pdf_to_image_benchmark import main as benchmark_main
+        return benchmark_main(sys.argv[2:])
+    if sys.argv[1:2] == ['serve']:
+        from pdf_to_image_server import main as serve_main
+        return serve_main(sys.argv[2:])
+    if sys.argv[1:2] == ['watch']:
+        from pdf_to_image_watch import main as watch_main
+        return watch_main(sys.argv[2:])
+    
+    args = parse_arguments()
+    
+    inputs = list(args.pdf_paths)
+    if args.from_file:
+        inputs += read_path_list(args.from_file)
+    elif not inputs and sys.stdin is not None and not sys.stdin.isatty():
+        inputs = read_path_list('-')
+    
+    if not inputs:
+        print("Error: no PDF files given")
+        return 1
+    
+    pdf_paths = expand_pdf_paths(inputs)
+    if not pdf_paths:
+        print("Error: no PDF files matched the given paths")
+        return 1
+    
+    render_cache = None
+    if args.render_cache:
+        render_cache = RenderCache(max_bytes=args.render_cache_size * 1024 * 1024)
+    
+    metrics_writer = MetricsWriter(args.metrics_file) if args.metrics_file else None
+    try:
+        return run_conversion(args, inputs, pdf_paths, render_cache, metrics_writer)
+    finally:
+        if metrics_writer:
+            metrics_writer.close()
 
 
 if __name__ == "__main__":
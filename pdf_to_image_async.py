@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+"""
+PDF to Image Converter - asyncio interface
+Renders PDF pages without blocking the event loop, for embedding the
+converter in async applications such as web services.
+
+Usage:
+    from contextlib import aclosing
+    from pdf_to_image_async import convert_async
+
+    async with aclosing(convert_async('document.pdf', dpi=150)) as pages:
+        async for page in pages:
+            print(page.page_num, len(page.data))
+"""
+
+import asyncio
+import io
+import time
+from collections import deque
+from pathlib import Path
+from PIL import Image
+from pdf2image.exceptions import PDFPopplerTimeoutError
+from pdf_to_image import (MetricsCollector, check_pnm_magic, emit_event, emit_skipped_pages, encode_image,
+                          get_output_directory, get_pages_to_render, get_pdftoppm_args, get_pnm_field_count,
+                          get_pnm_layout, get_poppler_path, get_poppler_process_options, get_save_options,
+                          get_selected_pages, group_page_ranges, load_document_info, write_page)
+
+
+class RenderedPage:
+    """
+    One converted page.
+
+    Pages written to an output directory carry their path and no data;
+    pages converted in memory carry the encoded image bytes and no path.
+    """
+
+    def __init__(self, page_num, width, height, data=None, path=None):
+        self.page_num = page_num
+        self.width = width
+        self.height = height
+        self.data = data
+        self.path = path
+
+    def __repr__(self):
+        return f"RenderedPage(page_num={self.page_num}, width={self.width}, height={self.height})"
+
+
+async def read_pnm_image_async(stream):
+    """
+    Read one binary PNM image from an asyncio stream.
+
+    Returns:
+        PIL Image, or None at the end of the stream
+    """
+    try:
+        magic = await stream.readexactly(2)
+    except asyncio.IncompleteReadError as error:
+        if error.partial:
+            raise ValueError("Truncated image header from Poppler")
+        return None
+    check_pnm_magic(magic)
+
+    fields = []
+    token = b''
+    while len(fields) < get_pnm_field_count(magic):
+        char = await stream.read(1)
+        if not char:
+            raise ValueError("Truncated image header from Poppler")
+        if char.isspace():
+            if token:
+                fields.append(int(token))
+                token = b''
+        else:
+            token += char
+
+    mode, rawmode, size = get_pnm_layout(magic, fields[0], fields[1])
+    try:
+        data = await stream.readexactly(size)
+    except asyncio.IncompleteReadError:
+        raise ValueError("Truncated image data from Poppler")
+    return Image.frombytes(mode, (fields[0], fields[1]), data, 'raw', rawmode)
+
+
+def encode_page(image, page_num, output_directory, pdf_name, settings, render_seconds):
+    """Encode one page, writing it to the output directory when there is one"""
+    if output_directory is not None:
+        output_filename = write_page(image, page_num, output_directory, pdf_name, settings, render_seconds)
+        return RenderedPage(page_num, image.width, image.height, path=Path(output_directory) / output_filename)
+
+    started = time.perf_counter()
+    buffer = io.BytesIO()
+    encode_image(image, buffer, settings['format'], settings.get('save_options'))
+    emit_event(settings, 'page', pdf=settings.get('pdf_path'), page=page_num, file=None,
+               width=image.width, height=image.height, render_seconds=render_seconds,
+               encode_seconds=time.perf_counter() - started, write_seconds=0.0, bytes=buffer.tell())
+    return RenderedPage(page_num, image.width, image.height, data=buffer.getvalue())
+
+
+async def render_range(pdf_path, first_page, last_page, output_directory, pdf_name, settings, pages):
+    """
+    Render a page range with pdftoppm and put the converted pages on a queue.
+
+    The queue is bounded, so when the consumer falls behind this task stops
+    reading and Poppler blocks on its full pipe. The timeout only counts time
+    spent waiting for Poppler, not time spent waiting for the consumer.
+    A final None marks the end of the range; errors are put on the queue
+    in place of the remaining pages.
+    """
+    args = get_pdftoppm_args(pdf_path, first_page, last_page, settings)
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        **get_poppler_process_options(settings.get('poppler_path')))
+    error_output = asyncio.ensure_future(process.stderr.read())
+    remaining = settings['timeout']
+    try:
+        page_num = first_page
+        while True:
+            started = time.perf_counter()
+            try:
+                image = await asyncio.wait_for(read_pnm_image_async(process.stdout), remaining)
+            except asyncio.TimeoutError:
+                raise PDFPopplerTimeoutError("Run poppler timeout.")
+            render_seconds = time.perf_counter() - started
+            remaining -= render_seconds
+            if image is None:
+                break
+
+            page = await asyncio.to_thread(encode_page, image, page_num, output_directory, pdf_name, settings,
+                                           render_seconds)
+            await pages.put(page)
+            page_num += 1
+
+        if await process.wait() != 0:
+            message = (await error_output).decode('utf8', 'ignore').strip()
+            raise RuntimeError(message or f"pdftoppm exited with code {process.returncode}")
+        await pages.put(None)
+    except Exception as error:
+        emit_event(settings, 'error', pdf=settings.get('pdf_path'), first_page=first_page, last_page=last_page,
+                   message=str(error))
+        await pages.put(error)
+    finally:
+        if process.returncode is None:
+            process.kill()
+            # The process only counts as finished once its pipes are drained
+            await process.stdout.read()
+            await process.wait()
+        error_output.cancel()
+
+
+async def convert_async(pdf_path, output_dir=None, dpi=150, format='jpg', overwrite=False, batch_size=5, timeout=300,
+                        workers=1, verify_existing=False, use_cache=True, on_event=None, profile='balanced',
+                        encoder_options=None, max_pending=2, pages=None):
+    """
+    Convert a PDF to images, yielding the pages in page order as they are ready.
+
+    At most `workers` pdftoppm processes run at a time and each holds at most
+    `max_pending` converted pages the consumer has not taken yet; beyond that
+    Poppler is paused until the consumer catches up. Cancelling the consuming
+    task, or closing the generator, kills the running pdftoppm processes.
+    Close the generator with contextlib.aclosing when leaving the loop early.
+
+    Args:
+        pdf_path: Path to the PDF file
+        output_dir: Write the images here and yield their paths. With None
+            the encoded images are yielded in memory and nothing is written
+        dpi: Image resolution in DPI
+        format: Image format (jpg, png or tiff)
+        overwrite: Whether to overwrite existing files in output_dir
+        batch_size: Number of pages rendered by one Poppler call
+        timeout: Seconds one Poppler call may spend rendering its pages
+        workers: Number of Poppler calls running at once
+        verify_existing: Re-render existing images that fail a header check
+        use_cache: Reuse PDF metadata cached on disk by earlier runs
+        on_event: Optional callback receiving a dict for every conversion
+            event; called from the event loop and from worker threads
+        profile: Encoder profile (fast, balanced or smallest)
+        encoder_options: Optional dict overriding the profile's encoder options
+        max_pending: Converted pages buffered per Poppler call
+        pages: Optional page selection, either a string such as
+            "1,5,200-210" or a list of page numbers (default: every page)
+
+    Yields:
+        RenderedPage for every page converted
+    """
+    metrics = MetricsCollector(on_event)
+    start_time = time.time()
+    started = time.perf_counter()
+    document_info = await asyncio.to_thread(load_document_info, pdf_path, use_cache)
+    page_count = document_info.page_count
+    metrics({'event': 'parse', 'time': time.time(), 'pdf': str(pdf_path), 'pages': page_count,
+             'seconds': time.perf_counter() - started})
+
+    settings = {
+        'dpi': dpi,
+        'format': format,
+        'timeout': timeout,
+        'poppler_path': get_poppler_path(),
+        'save_options': get_save_options(format, profile, encoder_options)[1],
+        'pdf_path': str(pdf_path),
+        'on_event': metrics
+    }
+
+    pdf_name = Path(pdf_path).stem
+    output_directory = None
+    selected_pages = get_selected_pages(pages, page_count)
+    pages_to_render = selected_pages
+    if output_dir is not None:
+        output_directory = get_output_directory(pdf_path, output_dir)
+        pages_to_render = get_pages_to_render(selected_pages, output_directory, pdf_name, format, overwrite,
+                                              verify_existing)
+        emit_skipped_pages(settings, selected_pages, pages_to_render)
+
+    # Ranges are started lazily so no more than `workers` Poppler processes
+    # exist at once; the oldest range is drained first to keep page order
+    ranges = deque(group_page_ranges(pages_to_render, batch_size))
+    running = deque()
+    try:
+        while ranges or running:
+            while ranges and len(running) < workers:
+                first_page, last_page = ranges.popleft()
+                page_queue = asyncio.Queue(max(1, max_pending))
+                task = asyncio.create_task(render_range(pdf_path, first_page, last_page, output_directory,
+                                                        pdf_name, settings, page_queue))
+                running.append((page_queue, task))
+
+            page_queue, task = running[0]
+            page = await page_queue.get()
+            if page is None:
+                running.popleft()
+                await task
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield page
+    finally:
+        for page_queue, task in running:
+            task.cancel()
+        await asyncio.gather(*(task for page_queue, task in running), return_exceptions=True)
+        emit_event(settings, 'done', pdf=str(pdf_path), pages=metrics.pages, seconds=time.time() - start_time)
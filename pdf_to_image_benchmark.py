@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+"""
+PDF to Image Converter - Benchmark
+Times the parse, render, encode and write stages of the conversion pipeline
+on synthetic PDFs and compares the results against a stored baseline.
+
+Usage:
+    python pdf_to_image_benchmark.py --output results.json
+    python pdf_to_image_benchmark.py --baseline baseline.json --tolerance 0.15
+    python pdf_to_image_benchmark.py --startup --repeat 10
+"""
+
+import os
+import sys
+import io
+import argparse
+import json
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+from pdf_to_image import ENCODER_PROFILES, MetricsCollector, convert_pdf_to_images
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Letter size in points
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+
+DOCUMENT_KINDS = ('text', 'vector', 'scan')
+
+# Case settings that identify a result when comparing against a baseline
+CASE_KEYS = ('kind', 'pages', 'dpi', 'batch_size', 'workers', 'format', 'profile')
+
+# Values assumed for case settings missing from older baselines
+CASE_DEFAULTS = {'profile': 'balanced'}
+
+# Fewest runs of each startup command; single runs are too noisy to compare
+STARTUP_MIN_RUNS = 5
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the PDF to image conversion pipeline.')
+    parser.add_argument('--kinds', default=','.join(DOCUMENT_KINDS),
+                        help='Synthetic document kinds to test (default: text,vector,scan)')
+    parser.add_argument('--pages', default='1,10', help='Page counts to test (default: 1,10)')
+    parser.add_argument('--dpi', default='150,300', help='DPI values to test (default: 150,300)')
+    parser.add_argument('--batch-sizes', default='5', help='Batch sizes to test (default: 5)')
+    parser.add_argument('--workers', default='1,4', help='Worker counts to test (default: 1,4)')
+    parser.add_argument('--formats', default='jpg', help='Output formats to test (default: jpg)')
+    parser.add_argument('--profiles', default='balanced',
+                        help=f"Encoder profiles to test, from {', '.join(ENCODER_PROFILES)} (default: balanced)")
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per case; the fastest is kept (default: 1)')
+    parser.add_argument('--work-dir', help='Directory for the generated PDFs (default: a temporary directory)')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against results from an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown against the baseline as a fraction (default: 0.2)')
+    parser.add_argument('--startup', action='store_true',
+                        help='Time starting the command line tool (--help and a one-page conversion) instead')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def parse_list(value, cast=int):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def write_pdf(path, page_streams, fonts=False):
+    """Write a minimal PDF with one content stream per page"""
+    objects = []
+    page_ids = []
+    first_page_id = 4
+    for index, stream in enumerate(page_streams):
+        page_id = first_page_id + index * 2
+        page_ids.append(page_id)
+        resources = '/Font << /F1 3 0 R >>' if fonts else ''
+        objects.append((page_id, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                                 f"/Resources << {resources} >> /Contents {page_id + 1} 0 R >>".encode('latin-1')))
+        objects.append((page_id + 1, f"<< /Length {len(stream)} >>\nstream\n".encode('latin-1')
+                        + stream + b"\nendstream"))
+
+    kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids)
+    objects = [
+        (1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode('latin-1')),
+        (3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"),
+    ] + objects
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id, body in objects:
+        offsets[object_id] = output.tell()
+        output.write(f"{object_id} 0 obj\n".encode('latin-1') + body + b"\nendobj\n")
+
+    xref_offset = output.tell()
+    output.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1'))
+    for object_id in range(1, len(objects) + 1):
+        output.write(f"{offsets[object_id]:010d} 00000 n \n".encode('latin-1'))
+    output.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n"
+                 .encode('latin-1'))
+
+    with open(path, 'wb') as f:
+        f.write(output.getvalue())
+
+
+def make_text_stream(rng):
+    """A page of running text"""
+    words = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'render', 'poppler', 'page', 'image', 'convert']
+    lines = [b"BT /F1 10 Tf 12 TL 54 740 Td"]
+    for _ in range(55):
+        line = ' '.join(rng.choice(words) for _ in range(14))
+        lines.append(f"({line}) Tj T*".encode('latin-1'))
+    lines.append(b"ET")
+    return b"\n".join(lines)
+
+
+def make_vector_stream(rng):
+    """A page of thousands of stroked curves, like a technical drawing"""
+    ops = [b"0.3 w"]
+    for _ in range(3000):
+        points = ' '.join(f"{rng.uniform(0, PAGE_WIDTH):.1f} {rng.uniform(0, PAGE_HEIGHT):.1f}" for _ in range(4))
+        x, y, x1, y1, x2, y2, x3, y3 = points.split()
+        ops.append(f"{rng.random():.2f} {rng.random():.2f} {rng.random():.2f} RG "
+                   f"{x} {y} m {x1} {y1} {x2} {y2} {x3} {y3} c S".encode('latin-1'))
+    return b"\n".join(ops)
+
+
+def make_scan_pdf(path, page_count, rng):
+    """Full-page noisy images at 150 DPI, like a scanned document"""
+    from PIL import Image
+
+    size = (PAGE_WIDTH * 150 // 72, PAGE_HEIGHT * 150 // 72)
+    pages = []
+    for _ in range(page_count):
+        noise = Image.effect_noise(size, 40 + rng.random() * 20)
+        pages.append(Image.merge('RGB', (noise, noise.point(lambda value: value * 0.9), noise)))
+    pages[0].save(path, 'PDF', resolution=150, save_all=True, append_images=pages[1:])
+
+
+def generate_document(work_dir, kind, page_count):
+    """Create (or reuse) a synthetic PDF of the given kind and page count"""
+    path = Path(work_dir) / f"{kind}_{page_count}.pdf"
+    if path.exists():
+        return path
+
+    rng = random.Random(f"{kind}-{page_count}")
+    if kind == 'text':
+        write_pdf(path, [make_text_stream(rng) for _ in range(page_count)], fonts=True)
+    elif kind == 'vector':
+        write_pdf(path, [make_vector_stream(rng) for _ in range(page_count)])
+    elif kind == 'scan':
+        make_scan_pdf(path, page_count, rng)
+    else:
+        raise ValueError(f"Unknown document kind: {kind}")
+    return path
+
+
+def get_peak_rss_mb(who):
+    """Peak resident memory in MB of this process or its finished children"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def run_case(case):
+    """
+    Convert one synthetic PDF with the case settings and time every stage.
+
+    The case runs through convert_pdf_to_images, the same path as the command
+    line tool, and the stage times are taken from its conversion events.
+    """
+    metrics = MetricsCollector()
+    with tempfile.TemporaryDirectory() as output_directory:
+        wall_start = time.perf_counter()
+        # Keep the conversion report off stdout, which carries the result
+        with redirect_stdout(sys.stderr):
+            exit_code = convert_pdf_to_images(case['pdf_path'], output_directory, dpi=case['dpi'],
+                                              format=case['format'], overwrite=True, batch_size=case['batch_size'],
+                                              workers=case['workers'], use_cache=False, on_event=metrics,
+                                              profile=case['profile'])
+        wall_seconds = time.perf_counter() - wall_start
+    if exit_code != 0:
+        raise RuntimeError(f"Conversion of {case['pdf_path']} failed")
+
+    result = {key: case[key] for key in CASE_KEYS}
+    result.update({
+        'parse_seconds': metrics.seconds['parse'],
+        # Stage times are summed over all workers
+        'render_seconds': metrics.seconds['render'],
+        'encode_seconds': metrics.seconds['encode'],
+        'write_seconds': metrics.seconds['write'],
+        'wall_seconds': wall_seconds,
+        'pages_per_sec': metrics.pages / wall_seconds if wall_seconds > 0 else 0.0,
+        'encode_ms_per_page': metrics.seconds['encode'] * 1000 / max(1, metrics.pages),
+        'bytes_written': metrics.bytes_written,
+        'peak_rss_mb': get_peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        'peak_poppler_rss_mb': get_peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+    })
+    return result
+
+
+def run_case_isolated(case):
+    """Run a case in a fresh interpreter so its peak memory is measured on its own"""
+    command = [sys.executable, os.path.abspath(__file__), '--case', json.dumps(case)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip() or f"benchmark case exited with code {completed.returncode}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def get_case_key(result):
+    return tuple(result.get(key, CASE_DEFAULTS.get(key)) for key in CASE_KEYS)
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Return a description of every case that got slower or bigger than the baseline allows"""
+    baseline_cases = {get_case_key(result): result for result in baseline.get('cases', [])}
+    regressions = []
+    for result in results:
+        previous = baseline_cases.get(get_case_key(result))
+        if not previous:
+            continue
+        name = ', '.join(f"{key}={result[key]}" for key in CASE_KEYS)
+        if result['pages_per_sec'] < previous['pages_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: {result['pages_per_sec']:.2f} pages/sec "
+                               f"(baseline {previous['pages_per_sec']:.2f})")
+        if (result.get('peak_rss_mb') and previous.get('peak_rss_mb')
+                and result['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + tolerance)):
+            regressions.append(f"{name}: peak RSS {result['peak_rss_mb']:.0f} MB "
+                               f"(baseline {previous['peak_rss_mb']:.0f} MB)")
+    return regressions
+
+
+def print_result(result):
+    print(f"{result['kind']:>6} {result['pages']:>5} {result['dpi']:>5} {result['batch_size']:>5} "
+          f"{result['workers']:>7} {result['format']:>6} {result['profile']:>8} "
+          f"{result['parse_seconds']:>7.2f} {result['render_seconds']:>7.2f} {result['encode_seconds']:>7.2f} "
+          f"{result['write_seconds']:>7.2f} {result['encode_ms_per_page']:>9.1f} {result['pages_per_sec']:>9.2f} "
+          f"{(result['peak_rss_mb'] or 0):>8.0f}")
+
+
+def time_command(command, runs, env=None):
+    """Fastest wall time in seconds of a command over several runs"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env, check=True)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run_startup_benchmark(args):
+    """
+    Time how long the command line tool takes to start.
+
+    Batch scripts that call the tool once per small PDF spend most of their
+    time here, so --help and a one-page conversion are timed end to end.
+    """
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='pdf_to_image_benchmark_')
+    os.makedirs(work_dir, exist_ok=True)
+    pdf_path = generate_document(work_dir, 'text', 1)
+    script = str(Path(__file__).with_name('pdf_to_image.py'))
+    runs = max(STARTUP_MIN_RUNS, args.repeat)
+    # A cache of its own, warmed by the first run, as in a repeated batch job
+    env = dict(os.environ, PDF_TO_IMAGE_CACHE=os.path.join(work_dir, 'cache'))
+
+    print(f"Timing command line startup, fastest of {runs} runs")
+    startup = {
+        'help_seconds': time_command([sys.executable, script, '--help'], runs, env),
+        'convert_seconds': time_command([sys.executable, script, str(pdf_path), '--output-dir',
+                                         os.path.join(work_dir, 'startup_output'), '--overwrite'], runs, env)
+    }
+    print(f"  --help:            {startup['help_seconds'] * 1000:8.0f} ms")
+    print(f"  one-page convert:  {startup['convert_seconds'] * 1000:8.0f} ms")
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'startup': startup
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            previous = json.load(f).get('startup', {})
+        regressions = [f"{name}: {seconds * 1000:.0f} ms (baseline {previous[name] * 1000:.0f} ms)"
+                       for name, seconds in startup.items()
+                       if previous.get(name) and seconds > previous[name] * (1 + args.tolerance)]
+        if regressions:
+            print(f"\nRegressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+
+    return 0
+
+
+def run_benchmark(args):
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='pdf_to_image_benchmark_')
+    os.makedirs(work_dir, exist_ok=True)
+
+    print(f"Benchmark documents: {work_dir}")
+    print(f"{'kind':>6} {'pages':>5} {'dpi':>5} {'batch':>5} {'workers':>7} {'format':>6} {'profile':>8} "
+          f"{'parse':>7} {'render':>7} {'encode':>7} {'write':>7} {'enc ms/pg':>9} {'pages/s':>9} {'rss MB':>8}")
+
+    results = []
+    for kind in parse_list(args.kinds, str):
+        for page_count in parse_list(args.pages):
+            pdf_path = generate_document(work_dir, kind, page_count)
+            for dpi in parse_list(args.dpi):
+                for batch_size in parse_list(args.batch_sizes):
+                    for workers in parse_list(args.workers):
+                        for format in parse_list(args.formats, str):
+                            for profile in parse_list(args.profiles, str):
+                                case = {'pdf_path': str(pdf_path), 'kind': kind, 'pages': page_count, 'dpi': dpi,
+                                        'batch_size': batch_size, 'workers': workers, 'format': format,
+                                        'profile': profile}
+                                runs = [run_case_isolated(case) for _ in range(max(1, args.repeat))]
+                                result = max(runs, key=lambda run: run['pages_per_sec'])
+                                print_result(result)
+                                results.append(result)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'cases': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+
+    return 0
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    if args.case:
+        print(json.dumps(run_case(json.loads(args.case))))
+        return 0
+    if args.startup:
+        return run_startup_benchmark(args)
+    return run_benchmark(args)
+
+
+if __name__ == "__main__":
+    exit(main())
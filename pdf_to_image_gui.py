@@ -6,41 +6,35 @@ A user-friendly interface for converting PDF files to images.
 
 import os
 import sys
+import queue
 import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import FreeSimpleGUI as sg
-from pdf_to_image import convert_pdf_to_images, get_page_dimensions
-
-def get_poppler_path():
-    """Get the path to bundled Poppler or system Poppler"""
-    if getattr(sys, 'frozen', False):
-        # Running as PyInstaller bundle
-        bundle_dir = Path(sys._MEIPASS)
-        poppler_path = bundle_dir / "poppler" / "bin"
-        if poppler_path.exists():
-            return str(poppler_path)
-    
-    # Check if poppler is in the script directory (for development)
-    script_dir = Path(__file__).parent
-    local_poppler = script_dir / "poppler"
-    for item in local_poppler.iterdir() if local_poppler.exists() else []:
-        if item.is_dir() and "poppler" in item.name.lower():
-            bin_path = item / "Library" / "bin"
-            if bin_path.exists():
-                return str(bin_path)
-    
-    # Return None to use system PATH
-    return None
+from pdf_to_image import (MetricsCollector, convert_page_range, find_missing_pages, get_batch_settings,
+                          get_page_sizes, get_poppler_path, get_save_options, get_selected_pages, group_page_ranges,
+                          load_document_info, parse_page_ranges, split_page_ranges)
 
 # Set PySimpleGUI theme
 sg.theme('LightBlue3')
 
+# Lines kept in the output log; older lines are dropped
+MAX_LOG_LINES = 500
+
+# Worker events applied to the window per event loop pass
+MAX_EVENTS_PER_REFRESH = 1000
+
 class PDFConverterGUI:
     def __init__(self):
         self.window = None
         self.conversion_thread = None
         self.cancel_conversion = False
+        # Worker threads never touch the window; they queue events that the
+        # event loop applies in batches
+        self.events = queue.Queue()
+        self.log_lines = deque(maxlen=MAX_LOG_LINES)
         
     def create_layout(self):
         """Create the GUI layout"""
@@ -62,17 +56,34 @@ class PDFConverterGUI:
             [sg.Text('Conversion Settings:', font=('Arial', 10, 'bold'))],
             [sg.Text('Image Format:'), 
              sg.Radio('JPG', 'FORMAT', key='-JPG-', default=True),
-             sg.Radio('PNG', 'FORMAT', key='-PNG-')],
+             sg.Radio('PNG', 'FORMAT', key='-PNG-'),
+             sg.Radio('TIFF', 'FORMAT', key='-TIFF-')],
+            [sg.Text('Encoding:'), 
+             sg.Combo(['fast', 'balanced', 'smallest'], default_value='balanced', key='-PROFILE-', readonly=True,
+                      size=(10, 1)),
+             sg.Text('(Fast skips compression passes, smallest spends time on file size)')],
             [sg.Text('DPI (Resolution):'), 
              sg.Input('150', key='-DPI-', size=(10, 1)),
              sg.Text('(Higher = better quality, larger files)')],
+            [sg.Text('Max Size (px):'), 
+             sg.Text('Width'), sg.Input('', key='-MAX_WIDTH-', size=(6, 1)),
+             sg.Text('Height'), sg.Input('', key='-MAX_HEIGHT-', size=(6, 1)),
+             sg.Text('Long edge'), sg.Input('', key='-LONG_EDGE-', size=(6, 1)),
+             sg.Text('(Overrides DPI - leave blank to use DPI)')],
+            [sg.Text('Pages:'), 
+             sg.Input('', key='-PAGES-', size=(20, 1)),
+             sg.Text('(e.g. 1,5,200-210 - leave blank for all pages)')],
             [sg.Text('Batch Size:'), 
              sg.Input('5', key='-BATCH_SIZE-', size=(10, 1)),
              sg.Text('(Pages processed at once - lower for large PDFs)')],
+            [sg.Text('Workers:'), 
+             sg.Input('1', key='-WORKERS-', size=(10, 1)),
+             sg.Text('(Batches rendered in parallel)')],
             [sg.Text('Timeout (seconds):'), 
              sg.Input('300', key='-TIMEOUT-', size=(10, 1)),
              sg.Text('(Maximum time per batch)')],
-            [sg.Checkbox('Overwrite existing files', key='-OVERWRITE-', default=False)]
+            [sg.Checkbox('Overwrite existing files', key='-OVERWRITE-', default=False),
+             sg.Checkbox('Verify existing files', key='-VERIFY-', default=False)]
         ]
         
         # Progress section
@@ -137,6 +148,7 @@ class PDFConverterGUI:
         else:
             status_msg = "ℹ Using system Poppler (must be installed separately)\n"
         
+        self.log_lines.append(status_msg.rstrip('\n'))
         self.window['-OUTPUT-'].update(status_msg)
         
     def validate_inputs(self, values):
@@ -161,6 +173,22 @@ class PDFConverterGUI:
         except ValueError:
             errors.append("DPI must be a valid number")
         
+        # Check pixel limits
+        for key, label in (('-MAX_WIDTH-', 'Max width'), ('-MAX_HEIGHT-', 'Max height'), ('-LONG_EDGE-', 'Long edge')):
+            if values[key].strip():
+                try:
+                    if int(values[key]) < 1:
+                        errors.append(f"{label} must be at least 1 pixel")
+                except ValueError:
+                    errors.append(f"{label} must be a valid number")
+        
+        # Check page selection
+        if values['-PAGES-'].strip():
+            try:
+                parse_page_ranges(values['-PAGES-'])
+            except ValueError as e:
+                errors.append(f"Pages: {e}")
+        
         # Check batch size
         try:
             batch_size = int(values['-BATCH_SIZE-'])
@@ -169,6 +197,14 @@ class PDFConverterGUI:
         except ValueError:
             errors.append("Batch size must be a valid number")
         
+        # Check workers
+        try:
+            workers = int(values['-WORKERS-'])
+            if workers < 1 or workers > 32:
+                errors.append("Workers must be between 1 and 32")
+        except ValueError:
+            errors.append("Workers must be a valid number")
+        
         # Check timeout
         try:
             timeout = int(values['-TIMEOUT-'])
@@ -180,45 +216,90 @@ class PDFConverterGUI:
         return errors
     
     def update_output(self, message):
-        """Update the output log"""
-        if self.window:
-            current_text = self.window['-OUTPUT-'].get()
-            timestamp = time.strftime('%H:%M:%S')
-            new_text = f"[{timestamp}] {message}\n"
-            self.window['-OUTPUT-'].update(current_text + new_text)
-            self.window.refresh()
+        """Queue a line for the output log"""
+        timestamp = time.strftime('%H:%M:%S')
+        self.events.put(('log', f"[{timestamp}] {message}"))
     
     def update_status(self, message):
-        """Update the status line"""
-        if self.window:
-            self.window['-STATUS-'].update(message)
-            self.window.refresh()
+        """Queue a new status line"""
+        self.events.put(('status', message))
     
     def update_progress(self, percentage):
-        """Update the progress bar"""
-        if self.window:
-            self.window['-PROGRESS-'].update(percentage)
-            self.window.refresh()
+        """Queue a new progress bar value"""
+        self.events.put(('progress', percentage))
+    
+    def process_events(self):
+        """
+        Apply queued worker events to the window.
+        
+        Called from the event loop on every pass. New log lines are appended
+        in one update, and only the latest status and progress values are
+        shown, so the cost per pass does not grow with the number of pages.
+        """
+        new_lines = []
+        status = None
+        progress = None
+        finished = False
+        
+        for _ in range(MAX_EVENTS_PER_REFRESH):
+            try:
+                kind, value = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'log':
+                new_lines.append(value)
+            elif kind == 'status':
+                status = value
+            elif kind == 'progress':
+                progress = value
+            elif kind == 'finished':
+                finished = True
+        
+        if new_lines:
+            overflow = len(self.log_lines) + len(new_lines) > MAX_LOG_LINES
+            self.log_lines.extend(new_lines)
+            if overflow:
+                # Rewrite the capped log instead of letting the widget grow
+                self.window['-OUTPUT-'].update('\n'.join(self.log_lines) + '\n')
+            else:
+                self.window['-OUTPUT-'].update('\n'.join(new_lines) + '\n', append=True)
+        if status is not None:
+            self.window['-STATUS-'].update(status)
+        if progress is not None:
+            self.window['-PROGRESS-'].update(progress)
+        if finished:
+            # Re-enable convert button and disable cancel
+            self.window['-CONVERT-'].update(disabled=False)
+            self.window['-CANCEL-'].update(disabled=True)
     
-    def conversion_worker(self, pdf_path, output_dir, dpi, img_format, overwrite, batch_size, timeout):
+    def conversion_worker(self, pdf_path, output_dir, dpi, img_format, overwrite, batch_size, timeout, workers,
+                          verify_existing=False, profile='balanced', pages=None, pixel_limits=(None, None, None)):
         """Worker function for PDF conversion in a separate thread"""
         try:
             self.update_output(f"Starting conversion of: {os.path.basename(pdf_path)}")
             self.update_output(f"Output directory: {output_dir}")
-            self.update_output(f"Settings: {img_format.upper()}, {dpi} DPI, batch size {batch_size}")
+            resolution = f"{dpi} DPI" if not any(pixel_limits) else "fitted to the max size"
+            self.update_output(f"Settings: {img_format.upper()} ({profile}), {resolution}, batch size {batch_size}, "
+                               f"{workers} worker(s)")
+            page_sizes = None
             
             # Get PDF info first
             try:
-                page_dimensions = get_page_dimensions(pdf_path)
-                total_pages = len(page_dimensions)
+                document_info = load_document_info(pdf_path)
+                page_dimensions = document_info.page_dimensions
+                total_pages = document_info.page_count
                 self.update_output(f"PDF has {total_pages} pages")
+                page_sizes = get_page_sizes(page_dimensions, range(1, total_pages + 1), *pixel_limits)
                 
                 # Display page info
                 for i, (width_pt, height_pt) in enumerate(page_dimensions[:5]):  # Show first 5 pages
                     width_in = width_pt / 72
                     height_in = height_pt / 72
-                    width_px = int(width_in * dpi)
-                    height_px = int(height_in * dpi)
+                    if page_sizes:
+                        width_px, height_px = page_sizes[i + 1]
+                    else:
+                        width_px = int(width_in * dpi)
+                        height_px = int(height_in * dpi)
                     self.update_output(f"Page {i+1}: {width_in:.1f}\"×{height_in:.1f}\" → {width_px}×{height_px}px")
                 
                 if total_pages > 5:
@@ -229,82 +310,90 @@ class PDFConverterGUI:
                 total_pages = 1  # Fallback
             
             # Custom conversion with progress updates
-            self.convert_with_progress(pdf_path, output_dir, dpi, img_format, overwrite, batch_size, timeout, total_pages)
+            self.convert_with_progress(pdf_path, output_dir, dpi, img_format, overwrite, batch_size, timeout,
+                                       total_pages, workers, verify_existing, profile, pages, page_sizes)
             
         except Exception as e:
             self.update_output(f"Error during conversion: {str(e)}")
             self.update_status("Conversion failed!")
         finally:
-            # Re-enable convert button and disable cancel
-            if self.window:
-                self.window['-CONVERT-'].update(disabled=False)
-                self.window['-CANCEL-'].update(disabled=True)
+            self.events.put(('finished', None))
     
-    def convert_with_progress(self, pdf_path, output_dir, dpi, img_format, overwrite, batch_size, timeout, total_pages):
+    def convert_with_progress(self, pdf_path, output_dir, dpi, img_format, overwrite, batch_size, timeout, total_pages,
+                              workers=1, verify_existing=False, profile='balanced', pages=None, page_sizes=None):
         """Convert PDF with progress updates"""
-        from pdf2image import convert_from_path
-        from PIL import Image
-        
         # Get PDF base name
         pdf_name = Path(pdf_path).stem
         fmt = img_format.lower()
-        save_format = "JPEG" if fmt == "jpg" else "PNG"
-        file_ext = f".{fmt}"
+        # Collect per-stage timings to report when the conversion finishes
+        metrics = MetricsCollector()
+        settings = {
+            'dpi': dpi,
+            'format': fmt,
+            'timeout': timeout,
+            'poppler_path': get_poppler_path(),
+            'save_options': get_save_options(fmt, profile)[1],
+            'pdf_path': pdf_path,
+            'on_event': metrics
+        }
+        
+        # Only render the selected pages whose images are not there yet
+        selected_pages = get_selected_pages(pages, total_pages)
+        if len(selected_pages) < total_pages:
+            self.update_output(f"Converting {len(selected_pages)} selected pages")
+        pages_to_render = selected_pages
+        if not overwrite:
+            pages_to_render = find_missing_pages(pages_to_render, output_dir, pdf_name, fmt,
+                                                 verify=verify_existing)
+            skipped = len(selected_pages) - len(pages_to_render)
+            if skipped:
+                self.update_output(f"Skipping {skipped} of {len(selected_pages)} pages (already exist)")
         
         # Process pages in batches
         pages_processed = 0
+        pages_total = max(1, len(pages_to_render))
+        start_time = time.time()
+        batches = group_page_ranges(pages_to_render, batch_size)
+        if page_sizes:
+            # Fitted pages of different sizes need their own Poppler calls
+            batches = split_page_ranges(batches, page_sizes)
         
-        for batch_start in range(0, total_pages, batch_size):
-            if self.cancel_conversion:
-                self.update_output("Conversion cancelled by user")
-                self.update_status("Conversion cancelled")
-                return
-            
-            batch_end = min(batch_start + batch_size, total_pages)
-            
-            self.update_output(f"Processing pages {batch_start + 1}-{batch_end} of {total_pages}...")
-            self.update_status(f"Processing pages {batch_start + 1}-{batch_end} of {total_pages}")
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = [executor.submit(convert_page_range, pdf_path, first_page, last_page,
+                                       output_dir, pdf_name, get_batch_settings(settings, first_page, page_sizes))
+                       for first_page, last_page in batches]
             
-            try:
-                # Convert batch
-                images = convert_from_path(
-                    pdf_path,
-                    dpi=dpi,
-                    first_page=batch_start + 1,
-                    last_page=batch_end,
-                    timeout=timeout
-                )
+            for (first_page, last_page), future in zip(batches, futures):
+                if self.cancel_conversion:
+                    self.update_output("Conversion cancelled by user")
+                    self.update_status("Conversion cancelled")
+                    return
                 
-                # Save each image in the batch
-                for i, image in enumerate(images):
-                    if self.cancel_conversion:
-                        return
-                    
-                    page_num = batch_start + i + 1
-                    output_filename = f"{pdf_name}_{page_num}{file_ext}"
-                    output_path = Path(output_dir) / output_filename
-                    
-                    if os.path.exists(output_path) and not overwrite:
-                        self.update_output(f"Skipping page {page_num}: {output_filename} (already exists)")
-                        continue
-                    
-                    # Save image
-                    if fmt == 'jpg':
-                        image.save(output_path, save_format, quality=95, optimize=True)
-                    else:  # png
-                        image.save(output_path, save_format, optimize=True)
-                    
+                self.update_output(f"Processing pages {first_page}-{last_page} of {total_pages}...")
+                self.update_status(f"Processing pages {first_page}-{last_page} of {total_pages}")
+                
+                try:
+                    results = future.result()
+                except Exception as e:
+                    self.update_output(f"Error processing pages {first_page}-{last_page}: {str(e)}")
+                    continue
+                
+                for page_num, output_filename in results:
                     pages_processed += 1
-                    progress = int((pages_processed / total_pages) * 100)
+                    progress = int((pages_processed / pages_total) * 100)
                     self.update_progress(progress)
                     self.update_output(f"Saved page {page_num}: {output_filename}")
-            
-            except Exception as e:
-                self.update_output(f"Error processing pages {batch_start + 1}-{batch_end}: {str(e)}")
-                continue
+        finally:
+            # Drop batches that have not started yet when cancelled
+            executor.shutdown(wait=False, cancel_futures=True)
         
         if not self.cancel_conversion:
+            total_time = time.time() - start_time
             self.update_output(f"Conversion completed! {pages_processed} pages converted.")
+            if total_time > 0:
+                self.update_output(f"Throughput: {pages_processed / total_time:.2f} pages/sec")
+            self.update_output(metrics.summary())
             self.update_status("Conversion completed successfully!")
             self.update_progress(100)
         
@@ -318,7 +407,10 @@ class PDFConverterGUI:
             if event in (sg.WIN_CLOSED, '-EXIT-'):
                 break
             
-            elif event == '-SAME_DIR-':
+            # Apply what the conversion thread has queued since the last pass
+            self.process_events()
+            
+            if event == '-SAME_DIR-':
                 # Toggle output directory input
                 disabled = values['-SAME_DIR-']
                 self.window['-OUTPUT_DIR-'].update(disabled=disabled)
@@ -341,10 +433,21 @@ class PDFConverterGUI:
                     output_dir = values['-OUTPUT_DIR-']
                 
                 dpi = int(values['-DPI-'])
-                img_format = 'jpg' if values['-JPG-'] else 'png'
+                if values['-JPG-']:
+                    img_format = 'jpg'
+                elif values['-PNG-']:
+                    img_format = 'png'
+                else:
+                    img_format = 'tiff'
                 overwrite = values['-OVERWRITE-']
                 batch_size = int(values['-BATCH_SIZE-'])
                 timeout = int(values['-TIMEOUT-'])
+                workers = int(values['-WORKERS-'])
+                verify_existing = values['-VERIFY-']
+                profile = values['-PROFILE-']
+                pages = values['-PAGES-'].strip() or None
+                pixel_limits = tuple(int(values[key]) if values[key].strip() else None
+                                     for key in ('-MAX_WIDTH-', '-MAX_HEIGHT-', '-LONG_EDGE-'))
                 
                 # Reset progress and status
                 self.update_progress(0)
@@ -358,7 +461,8 @@ class PDFConverterGUI:
                 # Start conversion in separate thread
                 self.conversion_thread = threading.Thread(
                     target=self.conversion_worker,
-                    args=(pdf_path, output_dir, dpi, img_format, overwrite, batch_size, timeout)
+                    args=(pdf_path, output_dir, dpi, img_format, overwrite, batch_size, timeout, workers,
+                          verify_existing, profile, pages, pixel_limits)
                 )
                 self.conversion_thread.daemon = True
                 self.conversion_thread.start()
@@ -371,6 +475,7 @@ class PDFConverterGUI:
             
             elif event == '-CLEAR-':
                 # Clear the output log
+                self.log_lines.clear()
                 self.window['-OUTPUT-'].update('')
                 self.update_progress(0)
                 self.update_status("Ready to convert...")
@@ -0,0 +1,519 @@
+#!/usr/bin/env python
+"""
+PDF to Image Converter - local HTTP service
+Keeps a warm pool of render workers and converts PDFs posted to it, so
+callers do not pay for a fresh interpreter and Poppler lookup per file.
+
+Usage:
+    python pdf_to_image.py serve --port 8765 --workers 4
+
+    curl --data-binary @document.pdf -H "Content-Type: application/pdf" \\
+         "http://127.0.0.1:8765/convert?dpi=150&format=png" -o pages.zip
+    curl -d '{"path": "/data/document.pdf"}' -H "Content-Type: application/json" \\
+         "http://127.0.0.1:8765/convert?output=urls"
+    curl http://127.0.0.1:8765/metrics
+"""
+
+import os
+import argparse
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+from pdf_to_image import (ENCODER_PROFILES, convert_page_range_isolated, get_poppler_path, get_save_options,
+                          group_page_ranges, load_document_info)
+
+# Latencies kept for the percentiles reported by /metrics
+LATENCY_SAMPLES = 1000
+
+FORMATS = ('jpg', 'png', 'tiff')
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'tiff': 'image/tiff'}
+
+# Archive member listing the pages that could not be converted
+FAILURES_MEMBER = 'failures.json'
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Serve PDF to image conversions over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Number of page batches rendered in parallel (default: 2)')
+    parser.add_argument('--batch-size', type=int, default=5,
+                        help='Pages per Poppler call; also the unit of fair scheduling (default: 5)')
+    parser.add_argument('--timeout', type=int, default=300, help='Timeout per batch in seconds (default: 300)')
+    parser.add_argument('--max-upload-size', type=int, default=200,
+                        help='Largest accepted upload in MB (default: 200)')
+    parser.add_argument('--job-ttl', type=int, default=3600,
+                        help='Seconds the images of output=urls requests are kept (default: 3600)')
+    return parser.parse_args(argv)
+
+
+def get_percentiles(samples):
+    """Summarise latency samples in seconds as p50, p95 and max"""
+    if not samples:
+        return {'count': 0, 'p50': None, 'p95': None, 'max': None}
+    ordered = sorted(samples)
+
+    def percentile(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 4)
+
+    return {'count': len(ordered), 'p50': percentile(0.5), 'p95': percentile(0.95), 'max': round(ordered[-1], 4)}
+
+
+def get_safe_name(name):
+    """Reduce a client supplied name to characters that are safe in a file name"""
+    return re.sub(r'[^\w.-]', '_', name).lstrip('.') or 'document'
+
+
+class FairQueue:
+    """
+    Queue of render jobs that takes turns between clients.
+
+    Every client has its own FIFO and get() serves the clients round-robin,
+    so a client that posts a 500-page PDF delays other clients by at most
+    one batch per worker instead of its whole document.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.clients = OrderedDict()
+
+    def put(self, client, function, *args):
+        """Queue a call for a client and return a Future for its result"""
+        future = Future()
+        with self.condition:
+            self.clients.setdefault(client, deque()).append((future, time.perf_counter(), function, args))
+            self.condition.notify()
+        return future
+
+    def get(self):
+        """Wait for the next job, taking it from the client whose turn it is"""
+        with self.condition:
+            while not self.clients:
+                self.condition.wait()
+            client, jobs = next(iter(self.clients.items()))
+            job = jobs.popleft()
+            # Move the client to the back of the line, or drop it when it has nothing left
+            del self.clients[client]
+            if jobs:
+                self.clients[client] = jobs
+            return job
+
+    def depth(self):
+        with self.condition:
+            return {client: len(jobs) for client, jobs in self.clients.items()}
+
+
+class ConversionServer(ThreadingHTTPServer):
+    """HTTP server holding the render worker pool, finished jobs and request statistics"""
+
+    daemon_threads = True
+
+    def __init__(self, address, args):
+        super().__init__(address, ConversionRequestHandler)
+        self.args = args
+        # Looked up once; every request reuses the result
+        self.poppler_path = get_poppler_path()
+        self.work_dir = tempfile.mkdtemp(prefix='pdf_to_image_serve_')
+        self.jobs = {}
+        self.queue = FairQueue()
+        self.lock = threading.Lock()
+        self.busy_workers = 0
+        self.stats = {'requests': 0, 'completed': 0, 'failed': 0, 'active': 0}
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.queue_waits = deque(maxlen=LATENCY_SAMPLES)
+
+        for _ in range(max(1, args.workers)):
+            threading.Thread(target=self.run_worker, daemon=True).start()
+
+    def run_worker(self):
+        while True:
+            future, queued, function, args = self.queue.get()
+            # Jobs of requests that were abandoned are cancelled while queued
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self.lock:
+                self.queue_waits.append(time.perf_counter() - queued)
+                self.busy_workers += 1
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    self.busy_workers -= 1
+
+    def record(self, stat, change=1):
+        with self.lock:
+            self.stats[stat] += change
+
+    def record_latency(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def get_metrics(self):
+        depth = self.queue.depth()
+        with self.lock:
+            return {
+                'queue_depth': sum(depth.values()),
+                'queue_depth_by_client': depth,
+                'workers': max(1, self.args.workers),
+                'busy_workers': self.busy_workers,
+                **self.stats,
+                'stored_jobs': len(self.jobs),
+                'latency_seconds': get_percentiles(self.latencies),
+                'queue_wait_seconds': get_percentiles(self.queue_waits),
+            }
+
+    def create_job(self):
+        """Create a working directory for one request, removing expired jobs first"""
+        now = time.time()
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items() if now - job['created'] > self.args.job_ttl]
+            for job_id in expired:
+                shutil.rmtree(self.jobs.pop(job_id)['directory'], ignore_errors=True)
+
+        job_id = uuid.uuid4().hex
+        directory = os.path.join(self.work_dir, job_id)
+        os.makedirs(directory)
+        return job_id, directory
+
+    def store_job(self, job_id, directory, files):
+        with self.lock:
+            self.jobs[job_id] = {'directory': directory, 'files': set(files), 'created': time.time()}
+
+    def delete_job(self, job_id):
+        with self.lock:
+            job = self.jobs.pop(job_id, None)
+        if job:
+            shutil.rmtree(job['directory'], ignore_errors=True)
+        return job is not None
+
+    def server_close(self):
+        super().server_close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+class ChunkedWriter:
+    """
+    Write a response body with chunked transfer encoding.
+
+    The body is only complete once close() sends the last chunk, so a
+    response that stops without it is seen by the client as cut off
+    rather than as a short but valid download.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data):
+        if data:
+            self.stream.write(f'{len(data):x}\r\n'.encode('ascii'))
+            self.stream.write(data)
+            self.stream.write(b'\r\n')
+        return len(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.stream.write(b'0\r\n\r\n')
+        self.stream.flush()
+
+
+class RequestError(Exception):
+    """A request that cannot be served, with the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    """
+    Routes:
+        POST /convert          PDF upload (application/pdf) or {"path": ...} (application/json)
+        GET /jobs/<id>/<file>  One page image of an output=urls request
+        DELETE /jobs/<id>      Remove the images of an output=urls request
+        GET /metrics           Queue depth, worker use and latency percentiles
+        GET /health            Liveness check
+    """
+
+    server_version = 'pdf_to_image'
+
+    def do_GET(self):
+        parts = urlsplit(self.path).path.strip('/').split('/')
+        if parts == ['health']:
+            self.send_json(200, {'status': 'ok'})
+        elif parts == ['metrics']:
+            self.send_json(200, self.server.get_metrics())
+        elif len(parts) == 3 and parts[0] == 'jobs':
+            self.send_job_file(parts[1], parts[2])
+        else:
+            self.send_json(404, {'error': 'Not found'})
+
+    def do_DELETE(self):
+        parts = urlsplit(self.path).path.strip('/').split('/')
+        if len(parts) == 2 and parts[0] == 'jobs' and self.server.delete_job(parts[1]):
+            self.send_json(200, {'deleted': parts[1]})
+        else:
+            self.send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip('/') != '/convert':
+            self.send_json(404, {'error': 'Not found'})
+            return
+
+        started = time.perf_counter()
+        self.server.record('requests')
+        self.server.record('active')
+        job_id, directory = self.server.create_job()
+        keep_job = False
+        try:
+            options = self.get_options(parse_qs(url.query))
+            pdf_path, use_cache = self.read_input(directory, options)
+            if options['output'] == 'urls':
+                self.send_urls(job_id, directory, pdf_path, use_cache, options)
+                keep_job = True
+            else:
+                self.send_archive(directory, pdf_path, use_cache, options)
+            self.server.record('completed')
+        except RequestError as e:
+            self.server.record('failed')
+            self.send_json(e.status, {'error': str(e)})
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.record('failed')
+        except Exception as e:
+            self.server.record('failed')
+            self.log_error("Conversion failed: %s", e)
+            if not self.headers_sent():
+                self.send_json(500, {'error': str(e)})
+        finally:
+            self.server.record('active', -1)
+            self.server.record_latency(time.perf_counter() - started)
+            if not keep_job:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def headers_sent(self):
+        return getattr(self, '_headers_sent', False)
+
+    def end_headers(self):
+        self._headers_sent = True
+        super().end_headers()
+
+    def get_client(self):
+        """Requests are queued per client: the X-Client-Id header, or else the client address"""
+        return self.headers.get('X-Client-Id') or self.client_address[0]
+
+    def get_options(self, query):
+        def value(name, default):
+            return query.get(name, [default])[-1]
+
+        try:
+            options = {
+                'dpi': int(value('dpi', 150)),
+                'format': value('format', 'jpg'),
+                'profile': value('profile', 'balanced'),
+                'output': value('output', 'zip'),
+                'name': value('name', None),
+            }
+        except ValueError:
+            raise RequestError(400, "dpi must be a whole number")
+
+        if not 1 <= options['dpi'] <= 2400:
+            raise RequestError(400, "dpi must be between 1 and 2400")
+        if options['format'] not in FORMATS:
+            raise RequestError(400, f"format must be one of {', '.join(FORMATS)}")
+        if options['profile'] not in ENCODER_PROFILES:
+            raise RequestError(400, f"profile must be one of {', '.join(ENCODER_PROFILES)}")
+        if options['output'] not in ('zip', 'urls'):
+            raise RequestError(400, "output must be zip or urls")
+        if options['name']:
+            options['name'] = get_safe_name(options['name'])
+        return options
+
+    def read_input(self, directory, options):
+        """Get the PDF to convert, saving an upload into the job directory"""
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > self.server.args.max_upload_size * 1024 * 1024:
+            raise RequestError(413, f"Upload is larger than {self.server.args.max_upload_size} MB")
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip()
+
+        if content_type == 'application/json':
+            try:
+                pdf_path = json.loads(self.rfile.read(length))['path']
+            except (ValueError, KeyError, TypeError):
+                raise RequestError(400, 'Expected a JSON body of the form {"path": "document.pdf"}')
+            if not os.path.isfile(pdf_path):
+                raise RequestError(404, f"File not found: {pdf_path}")
+            options['name'] = options['name'] or get_safe_name(Path(pdf_path).stem)
+            return pdf_path, True
+
+        if not length:
+            raise RequestError(411, "Post the PDF as the request body with a Content-Length")
+        pdf_path = os.path.join(directory, 'upload.pdf')
+        with open(pdf_path, 'wb') as f:
+            remaining = length
+            while remaining:
+                chunk = self.rfile.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    raise RequestError(400, "Upload ended early")
+                f.write(chunk)
+                remaining -= len(chunk)
+        options['name'] = options['name'] or 'document'
+        # Uploads live at throwaway paths, so caching their metadata by path is pointless
+        return pdf_path, False
+
+    def queue_conversion(self, directory, pdf_path, use_cache, options):
+        """Split the PDF into page batches on the shared queue, returning their futures in page order"""
+        try:
+            page_count = load_document_info(pdf_path, use_cache).page_count
+        except Exception as e:
+            raise RequestError(400, f"Could not read PDF: {e}")
+
+        settings = {
+            'dpi': options['dpi'],
+            'format': options['format'],
+            'timeout': self.server.args.timeout,
+            'poppler_path': self.server.poppler_path,
+            'stream': True,
+            'direct': False,
+            'save_options': get_save_options(options['format'], options['profile'])[1],
+            'pdf_path': str(pdf_path),
+            'on_event': None
+        }
+        client = self.get_client()
+        return [self.server.queue.put(client, convert_page_range_isolated, pdf_path, first_page, last_page, directory,
+                                      options['name'], settings)
+                for first_page, last_page in group_page_ranges(range(1, page_count + 1),
+                                                               self.server.args.batch_size)]
+
+    def send_archive(self, directory, pdf_path, use_cache, options):
+        """
+        Stream a ZIP of the pages, adding each batch as soon as it and the batches before it are done.
+
+        Pages that fail on their own are left out and listed in a failures.json
+        member. Any other error ends the response without the ZIP central
+        directory and, for HTTP/1.1 clients, without the last chunk, so the
+        client sees a broken download instead of a valid but incomplete ZIP.
+        """
+        futures = self.queue_conversion(directory, pdf_path, use_cache, options)
+        self.close_connection = True
+        try:
+            chunked = self.request_version == 'HTTP/1.1'
+            if chunked:
+                self.protocol_version = 'HTTP/1.1'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/zip')
+            self.send_header('Content-Disposition', f'attachment; filename="{options["name"]}.zip"')
+            if chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+
+            body = ChunkedWriter(self.wfile) if chunked else self.wfile
+            # The images are already compressed, so they are stored as is. The archive is
+            # only closed when every batch made it, as closing writes the central directory.
+            archive = zipfile.ZipFile(body, 'w', zipfile.ZIP_STORED)
+            failures = []
+            try:
+                for future in futures:
+                    results, batch_failures = future.result()
+                    for page_num, output_filename in results:
+                        output_path = os.path.join(directory, output_filename)
+                        archive.write(output_path, output_filename)
+                        os.remove(output_path)
+                    failures += batch_failures
+            except BaseException:
+                # Detach the stream, or the archive would still write its central directory when collected
+                archive.fp = None
+                raise
+            if failures:
+                self.log_error("%d page(s) of %s failed", len(failures), options['name'])
+                archive.writestr(FAILURES_MEMBER, json.dumps(
+                    [{'page': failure['page'], 'error': failure['error'], 'timed_out': failure['timed_out']}
+                     for failure in failures], indent=2))
+            archive.close()
+            if chunked:
+                body.close()
+        finally:
+            # A failed batch or a client that went away leaves the rest unwanted
+            for future in futures:
+                future.cancel()
+
+    def send_urls(self, job_id, directory, pdf_path, use_cache, options):
+        """Convert all pages, keep them on the server and answer with their URLs"""
+        futures = self.queue_conversion(directory, pdf_path, use_cache, options)
+        results, failures = [], []
+        try:
+            for future in futures:
+                batch_results, batch_failures = future.result()
+                results += batch_results
+                failures += batch_failures
+        finally:
+            for future in futures:
+                future.cancel()
+
+        self.server.store_job(job_id, directory, [output_filename for page_num, output_filename in results])
+        self.send_json(200, {
+            'job': job_id,
+            'pages': [{'page': page_num, 'url': f'/jobs/{job_id}/{output_filename}'}
+                      for page_num, output_filename in results],
+            'failed': [{'page': failure['page'], 'error': failure['error'], 'timed_out': failure['timed_out']}
+                       for failure in failures]
+        })
+
+    def send_job_file(self, job_id, filename):
+        job = self.server.jobs.get(job_id)
+        if not job or filename not in job['files']:
+            self.send_json(404, {'error': 'Not found'})
+            return
+
+        path = os.path.join(job['directory'], filename)
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES.get(Path(filename).suffix[1:], 'application/octet-stream'))
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def send_json(self, status, data):
+        body = json.dumps(data, indent=2).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    server = ConversionServer((args.host, args.port), args)
+    host, port = server.server_address[:2]
+    print(f"Serving PDF conversions on http://{host}:{port} with {max(1, args.workers)} worker(s)")
+    if server.poppler_path:
+        print(f"Using bundled Poppler: {server.poppler_path}")
+    else:
+        print("Using system Poppler")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
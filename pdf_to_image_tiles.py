@@ -0,0 +1,471 @@
+#!/usr/bin/env python
+"""
+PDF to Image Converter - tiled rendering
+Renders very large pages (engineering drawings, maps) region by region with
+pdftoppm's crop options, so the whole page is never held in memory. The
+regions are cut into a DeepZoom or XYZ tile pyramid, or written band by band
+into a striped TIFF.
+
+Usage:
+    python pdf_to_image.py drawing.pdf --dpi 600 --tiles deepzoom
+    python pdf_to_image.py drawing.pdf --dpi 600 --tiles tiff
+"""
+
+import os
+import math
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from PIL import Image
+from pdf_to_image import (PIL_FORMATS, MetricsCollector, emit_event, get_output_directory, get_page_pixel_size,
+                          get_pdf_name, get_poppler_path, get_render_path, get_save_options, get_selected_pages,
+                          iter_rendered_pages, load_document_info)
+
+TILE_LAYOUTS = ('deepzoom', 'xyz', 'tiff')
+
+# Largest region Poppler renders at once; about 48 MB per worker for RGB
+REGION_PIXELS = 4096 * 4096
+
+# Rows per strip of a striped TIFF
+TIFF_ROWS_PER_STRIP = 64
+
+# Uncompressed size from which striped TIFFs are written as BigTIFF, leaving
+# room below the 4 GB offset limit of classic TIFF
+BIGTIFF_THRESHOLD = 0xF0000000
+
+# TIFF compression codes; striped TIFFs are written with zlib, so other
+# profile compressions fall back to Adobe Deflate
+TIFF_COMPRESSION = {'raw': 1, 'tiff_adobe_deflate': 8}
+
+TIFF_PHOTOMETRIC = {'1': 1, 'L': 1, 'RGB': 2}
+
+# TIFF field types: struct format and size of one value
+TIFF_TYPES = {3: ('H', 2), 4: ('I', 4), 5: ('II', 8), 16: ('Q', 8)}
+
+# Fill for the parts of XYZ edge tiles outside the page
+BACKGROUND = {'1': 1, 'L': 255, 'RGB': (255, 255, 255)}
+
+
+def render_region(pdf_path, page_num, x, y, width, height, settings):
+    """Render one rectangle of a page, in pixels at settings['dpi'], with a pdftoppm call of its own"""
+    images = list(iter_rendered_pages(pdf_path, page_num, page_num, dict(settings, crop=(x, y, width, height))))
+    if not images:
+        raise RuntimeError(f"Poppler rendered nothing for page {page_num} at {x},{y}")
+    return images[0]
+
+
+def get_marker_path(output_directory, pdf_name, page_num, layout, format):
+    """
+    Get the file that is written last for a tiled page.
+
+    Its presence means the page is complete: the .dzi descriptor, the
+    single tile of zoom level 0, or the TIFF itself.
+    """
+    if layout == 'deepzoom':
+        return Path(output_directory) / f"{pdf_name}_{page_num}.dzi"
+    if layout == 'xyz':
+        return Path(output_directory) / f"{pdf_name}_{page_num}" / '0' / '0' / f"0.{format}"
+    return Path(output_directory) / f"{pdf_name}_{page_num}.tiff"
+
+
+class TilePyramid:
+    """
+    The levels of a tile pyramid for one page and where their tiles are stored.
+
+    Levels are numbered from 0 at the top, where DeepZoom starts at a single
+    pixel and XYZ at a single tile, down to the full resolution. Edge tiles
+    of DeepZoom are cut to the page; XYZ tiles are always full size, padded
+    with white.
+    """
+
+    def __init__(self, output_directory, pdf_name, page_num, width, height, layout, format, tile_size,
+                 save_options):
+        self.width = width
+        self.height = height
+        self.layout = layout
+        self.format = format
+        self.tile_size = tile_size
+        self.save_options = save_options
+        if layout == 'deepzoom':
+            self.max_level = math.ceil(math.log2(max(width, height, 1)))
+            self.root = Path(output_directory) / f"{pdf_name}_{page_num}_files"
+        else:
+            self.max_level = max(0, math.ceil(math.log2(max(width, height, 1) / tile_size)))
+            self.root = Path(output_directory) / f"{pdf_name}_{page_num}"
+
+    def get_level_size(self, level):
+        scale = 2 ** (self.max_level - level)
+        return math.ceil(self.width / scale), math.ceil(self.height / scale)
+
+    def get_tile_count(self, level):
+        width, height = self.get_level_size(level)
+        return math.ceil(width / self.tile_size), math.ceil(height / self.tile_size)
+
+    def get_tile_box(self, level, column, row):
+        """Get the part of the level, as (left, top, right, bottom), a tile covers"""
+        width, height = self.get_level_size(level)
+        left = column * self.tile_size
+        top = row * self.tile_size
+        return left, top, min(left + self.tile_size, width), min(top + self.tile_size, height)
+
+    def get_tile_path(self, level, column, row):
+        if self.layout == 'deepzoom':
+            return self.root / str(level) / f"{column}_{row}.{self.format}"
+        return self.root / str(level) / str(column) / f"{row}.{self.format}"
+
+    def save_tile(self, image, level, column, row):
+        """Save one tile and return its size in bytes"""
+        path = self.get_tile_path(level, column, row)
+        os.makedirs(path.parent, exist_ok=True)
+        if self.layout == 'xyz' and image.size != (self.tile_size, self.tile_size):
+            padded = Image.new(image.mode, (self.tile_size, self.tile_size), BACKGROUND.get(image.mode, 0))
+            padded.paste(image)
+            image = padded
+        image.save(path, PIL_FORMATS[self.format], **self.save_options)
+        return os.path.getsize(path)
+
+    def load_tile(self, level, column, row):
+        """Load a tile cut to the part of the level it covers, or None if it is missing"""
+        left, top, right, bottom = self.get_tile_box(level, column, row)
+        try:
+            with Image.open(self.get_tile_path(level, column, row)) as image:
+                return image.crop((0, 0, right - left, bottom - top))
+        except OSError:
+            return None
+
+    def save_region(self, image, x, y):
+        """Cut a full resolution region, aligned to the tile grid, into tiles"""
+        size = 0
+        for top in range(0, image.height, self.tile_size):
+            for left in range(0, image.width, self.tile_size):
+                tile = image.crop((left, top, min(left + self.tile_size, image.width),
+                                   min(top + self.tile_size, image.height)))
+                size += self.save_tile(tile, self.max_level, (x + left) // self.tile_size,
+                                       (y + top) // self.tile_size)
+        return size
+
+    def build_tile(self, level, column, row):
+        """Build a tile from the four tiles below it and return its size in bytes"""
+        left, top, right, bottom = self.get_tile_box(level, column, row)
+        mode = None
+        children = []
+        for child_row in (row * 2, row * 2 + 1):
+            for child_column in (column * 2, column * 2 + 1):
+                child = self.load_tile(level + 1, child_column, child_row)
+                if child is not None:
+                    mode = mode or child.mode
+                    children.append((child_column, child_row, child))
+        if not children:
+            return 0
+
+        # Bilevel tiles are averaged in grayscale
+        mode = 'L' if mode == '1' else mode
+        canvas = Image.new(mode, ((right - left) * 2, (bottom - top) * 2), BACKGROUND.get(mode, 0))
+        for child_column, child_row, child in children:
+            canvas.paste(child.convert(mode), ((child_column - column * 2) * self.tile_size,
+                                               (child_row - row * 2) * self.tile_size))
+        tile = canvas.reduce(2).crop((0, 0, right - left, bottom - top))
+        return self.save_tile(tile, level, column, row)
+
+    def write_descriptor(self, output_directory, pdf_name, page_num):
+        """Write the DeepZoom .dzi file that describes the pyramid"""
+        with open(get_marker_path(output_directory, pdf_name, page_num, 'deepzoom', self.format), 'w',
+                  encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{self.format}" '
+                    f'Overlap="0" TileSize="{self.tile_size}">\n'
+                    f'  <Size Width="{self.width}" Height="{self.height}"/>\n'
+                    '</Image>\n')
+
+
+def render_pyramid(pdf_path, page_num, output_directory, pdf_name, settings, width, height, layout,
+                   tile_size, workers):
+    """
+    Render a page into a tile pyramid.
+
+    The full resolution level is rendered in square regions aligned to the
+    tile grid, up to `workers` at a time. Each lower level is built from the
+    tiles of the level below, so at most a few tiles are in memory per worker.
+
+    Returns:
+        (render_seconds, encode_seconds, bytes written)
+    """
+    pyramid = TilePyramid(output_directory, pdf_name, page_num, width, height, layout, settings['format'],
+                          tile_size, settings['save_options'])
+    region_size = max(1, int(math.sqrt(REGION_PIXELS)) // tile_size) * tile_size
+    regions = [(x, y, min(region_size, width - x), min(region_size, height - y))
+               for y in range(0, height, region_size) for x in range(0, width, region_size)]
+
+    def convert_region(region):
+        started = time.perf_counter()
+        image = render_region(pdf_path, page_num, *region, settings)
+        rendered = time.perf_counter()
+        size = pyramid.save_region(image, region[0], region[1])
+        return rendered - started, time.perf_counter() - rendered, size
+
+    render_seconds = encode_seconds = 0.0
+    size = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for region_render, region_encode, region_size in executor.map(convert_region, regions):
+            render_seconds += region_render
+            encode_seconds += region_encode
+            size += region_size
+
+        started = time.perf_counter()
+        for level in range(pyramid.max_level - 1, -1, -1):
+            columns, rows = pyramid.get_tile_count(level)
+            tiles = [(level, column, row) for row in range(rows) for column in range(columns)]
+            size += sum(executor.map(lambda tile: pyramid.build_tile(*tile), tiles))
+        encode_seconds += time.perf_counter() - started
+
+    if layout == 'deepzoom':
+        pyramid.write_descriptor(output_directory, pdf_name, page_num)
+    return render_seconds, encode_seconds, size
+
+
+class StripedTiffWriter:
+    """
+    Write an image to a TIFF file one band of rows at a time.
+
+    Strip data is written as it arrives and the directory, with the strip
+    offsets, at the end, so only the current band is held in memory.
+    Files that could pass 4 GB are written as BigTIFF.
+    """
+
+    def __init__(self, path, width, height, mode, compression, dpi):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.compression = compression
+        self.dpi = dpi
+        self.bits = 1 if mode == '1' else 8
+        self.samples = 3 if mode == 'RGB' else 1
+        raw_size = (width * self.bits * self.samples + 7) // 8 * height
+        self.big = raw_size > BIGTIFF_THRESHOLD
+        self.offsets = []
+        self.byte_counts = []
+        self.file = open(f"{path}.part", 'wb')
+        if self.big:
+            self.file.write(b'II' + struct.pack('<HHHQ', 43, 8, 0, 0))
+        else:
+            self.file.write(b'II' + struct.pack('<HI', 42, 0))
+
+    def write_band(self, image):
+        """Write the next band of rows; its height must be a multiple of the strip height, except at the end"""
+        for top in range(0, image.height, TIFF_ROWS_PER_STRIP):
+            data = image.crop((0, top, image.width, min(top + TIFF_ROWS_PER_STRIP, image.height))).tobytes()
+            if self.compression == 8:
+                data = zlib.compress(data, 6)
+            self.offsets.append(self.file.tell())
+            self.byte_counts.append(len(data))
+            self.file.write(data)
+            if self.file.tell() % 2:
+                self.file.write(b'\0')
+
+    def write_directory(self):
+        offset_type = 16 if self.big else 4
+        entries = [
+            (256, 4, [self.width]),
+            (257, 4, [self.height]),
+            (258, 3, [self.bits] * self.samples),
+            (259, 3, [self.compression]),
+            (262, 3, [TIFF_PHOTOMETRIC[self.mode]]),
+            (273, offset_type, self.offsets),
+            (277, 3, [self.samples]),
+            (278, 4, [TIFF_ROWS_PER_STRIP]),
+            (279, offset_type, self.byte_counts),
+            (282, 5, [(self.dpi, 1)]),
+            (283, 5, [(self.dpi, 1)]),
+            (284, 3, [1]),
+            (296, 3, [2]),
+        ]
+        inline_size = 8 if self.big else 4
+        fields = []
+        for tag, field_type, values in entries:
+            value_format, value_size = TIFF_TYPES[field_type]
+            data = b''.join(struct.pack(f"<{value_format}", *(value if isinstance(value, tuple) else (value,)))
+                            for value in values)
+            if len(data) > inline_size:
+                value_offset = self.file.tell()
+                self.file.write(data)
+                if self.file.tell() % 2:
+                    self.file.write(b'\0')
+                data = struct.pack('<Q' if self.big else '<I', value_offset)
+            fields.append(struct.pack('<HHQ' if self.big else '<HHI', tag, field_type, len(values))
+                          + data.ljust(inline_size, b'\0'))
+
+        directory_offset = self.file.tell()
+        self.file.write(struct.pack('<Q' if self.big else '<H', len(fields)))
+        self.file.write(b''.join(fields))
+        self.file.write(struct.pack('<Q' if self.big else '<I', 0))
+        self.file.seek(8 if self.big else 4)
+        self.file.write(struct.pack('<Q' if self.big else '<I', directory_offset))
+
+    def close(self):
+        self.write_directory()
+        self.file.close()
+        os.replace(f"{self.path}.part", self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(f"{self.path}.part")
+
+
+def render_striped_tiff(pdf_path, page_num, output_path, settings, width, height, workers):
+    """
+    Render a page into a striped TIFF.
+
+    The page is rendered in full width bands, up to `workers` at a time,
+    and the bands are written in order as they finish.
+
+    Returns:
+        (render_seconds, encode_seconds, bytes written)
+    """
+    band_height = max(1, REGION_PIXELS // width // TIFF_ROWS_PER_STRIP) * TIFF_ROWS_PER_STRIP
+    bands = [(0, y, width, min(band_height, height - y)) for y in range(0, height, band_height)]
+    mode = {'mono': '1', 'gray': 'L'}.get(settings.get('color_mode'), 'RGB')
+    compression = TIFF_COMPRESSION.get(settings['save_options'].get('compression'), 8)
+
+    def render_band(band):
+        started = time.perf_counter()
+        image = render_region(pdf_path, page_num, *band, settings)
+        if image.size != band[2:] or image.mode != mode:
+            # Poppler may round the page size differently by a pixel
+            padded = Image.new(mode, band[2:], BACKGROUND[mode])
+            padded.paste(image.convert(mode))
+            image = padded
+        return image, time.perf_counter() - started
+
+    writer = StripedTiffWriter(output_path, width, height, mode, compression, settings['dpi'])
+    render_seconds = encode_seconds = 0.0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            # Bands are rendered ahead only as far as there are workers
+            running = deque()
+            remaining = deque(bands)
+            while remaining or running:
+                while remaining and len(running) < max(1, workers):
+                    running.append(executor.submit(render_band, remaining.popleft()))
+                image, band_seconds = running.popleft().result()
+                render_seconds += band_seconds
+                started = time.perf_counter()
+                writer.write_band(image)
+                encode_seconds += time.perf_counter() - started
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return render_seconds, encode_seconds, os.path.getsize(output_path)
+
+
+def convert_pdf_to_tiles(pdf_path, output_dir=None, dpi=150, format='jpg', overwrite=False, timeout=300, workers=1,
+                         use_cache=True, on_event=None, profile='balanced', encoder_options=None, pages=None,
+                         color_mode='color', layout='deepzoom', tile_size=256):
+    """
+    Convert PDF pages to tile pyramids or striped TIFFs.
+
+    Pages are rendered in regions of at most REGION_PIXELS with pdftoppm's
+    crop options, so memory does not grow with the page size or DPI.
+
+    Args:
+        pdf_path: Path to the PDF file, or a PDFInput
+        output_dir: Output directory (default: next to the PDF)
+        dpi: Image resolution in DPI
+        format: Tile format for pyramids (jpg or png); TIFF layouts ignore it
+        overwrite: Whether to render pages whose output already exists
+        timeout: Timeout in seconds for rendering one region
+        workers: Number of regions rendered in parallel
+        use_cache: Reuse PDF metadata cached on disk by earlier runs
+        on_event: Optional callback receiving a dict for every conversion event
+        profile: Encoder profile (fast, balanced or smallest)
+        encoder_options: Optional dict overriding the profile's encoder options
+        pages: Optional page selection such as "1,5,200-210"
+        color_mode: Have Poppler render in color, gray or mono (1-bit)
+        layout: deepzoom ([pdf_name]_[page].dzi and [pdf_name]_[page]_files/),
+            xyz ([pdf_name]_[page]/{z}/{x}/{y}.[format]) or tiff
+            ([pdf_name]_[page].tiff)
+        tile_size: Tile edge in pixels for the pyramid layouts
+
+    Returns:
+        0 if every page converted, 1 otherwise
+    """
+    if layout != 'tiff' and format not in ('jpg', 'png'):
+        print("Error: tile pyramids are written as jpg or png")
+        return 1
+    if layout == 'tiff':
+        format = 'tiff'
+
+    start_time = time.time()
+    metrics = MetricsCollector(on_event)
+    try:
+        started = time.perf_counter()
+        document_info = load_document_info(pdf_path, use_cache)
+        metrics({'event': 'parse', 'time': time.time(), 'pdf': str(pdf_path), 'pages': document_info.page_count,
+                 'seconds': time.perf_counter() - started})
+        selected_pages = get_selected_pages(pages, document_info.page_count)
+        output_directory = get_output_directory(pdf_path, output_dir)
+        pdf_name = get_pdf_name(pdf_path)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return 1
+
+    settings = {
+        'dpi': dpi,
+        'format': format,
+        'timeout': timeout,
+        'poppler_path': get_poppler_path(),
+        'save_options': get_save_options(format, profile, encoder_options)[1],
+        'color_mode': color_mode,
+        'pdf_path': str(pdf_path),
+        'on_event': metrics
+    }
+
+    print(f"\nConverting PDF: {pdf_path}")
+    print(f"Tiled output: {layout}, format: {format}, DPI: {dpi}, "
+          f"{f'tile size: {tile_size}, ' if layout != 'tiff' else ''}{max(1, workers)} worker(s)")
+    print(f"Output directory: {output_directory}")
+
+    exit_code = 0
+    pages_rendered = 0
+    for page_num in selected_pages:
+        marker_path = get_marker_path(output_directory, pdf_name, page_num, layout, format)
+        if not overwrite and marker_path.exists():
+            emit_event(settings, 'skip', pdf=settings['pdf_path'], page=page_num, reason='exists')
+            print(f"  Skipping page {page_num} (already exists)")
+            continue
+
+        width, height = get_page_pixel_size(*document_info.page_dimensions[page_num - 1], dpi)
+        print(f"  Rendering page {page_num}: {width} x {height} pixels")
+        try:
+            render_path = get_render_path(pdf_path)
+            if layout == 'tiff':
+                render_seconds, encode_seconds, size = render_striped_tiff(render_path, page_num, marker_path,
+                                                                           settings, width, height, workers)
+            else:
+                render_seconds, encode_seconds, size = render_pyramid(render_path, page_num, output_directory,
+                                                                      pdf_name, settings, width, height, layout,
+                                                                      tile_size, workers)
+        except Exception as e:
+            print(f"  Error processing page {page_num}: {str(e)}")
+            emit_event(settings, 'error', pdf=settings['pdf_path'], first_page=page_num, last_page=page_num,
+                       message=str(e))
+            exit_code = 1
+            continue
+
+        pages_rendered += 1
+        # Cutting, downscaling and saving tiles all count as encode time
+        emit_event(settings, 'page', pdf=settings['pdf_path'], page=page_num, file=marker_path.name,
+                   width=width, height=height, render_seconds=render_seconds, encode_seconds=encode_seconds,
+                   write_seconds=0.0, bytes=size)
+        print(f"  Saved page {page_num}: {marker_path.relative_to(output_directory)}")
+
+    total_time = time.time() - start_time
+    emit_event(settings, 'done', pdf=settings['pdf_path'], pages=pages_rendered, seconds=total_time)
+    print(f"\nConversion completed in {total_time:.1f} seconds")
+    print(metrics.summary())
+    print(f"Tiles saved to: {output_directory}")
+    return exit_code
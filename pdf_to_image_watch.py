@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+"""
+PDF to Image Converter - watch folder
+Watches a drop folder and converts PDFs as they arrive or change, keeping a
+small state index so a restart does not convert or re-check everything again.
+
+Usage:
+    python pdf_to_image.py watch incoming --output-dir pages --dpi 150
+    python pdf_to_image.py watch incoming --once
+"""
+
+import os
+import sys
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import select
+import struct
+import time
+from pathlib import Path
+from pdf_to_image import (AUTO_FORMATS, COLOR_MODE_ARGS, ENCODER_PROFILES, convert_pdf_to_images, get_cache_dir,
+                          get_file_digest, get_output_directory, get_output_filename, load_document_info,
+                          read_cache_entry, write_cache_entry)
+
+STATE_VERSION = 1
+
+# inotify event flags (linux/inotify.h)
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+IN_EVENT_HEADER = struct.Struct('iIII')
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Convert PDFs dropped into a folder as they arrive.')
+    parser.add_argument('input_dir', help='Folder to watch for PDF files')
+    parser.add_argument('--output-dir', help='Output directory for the images (default: next to each PDF)')
+    parser.add_argument('--dpi', type=int, default=150, help='Image resolution in DPI (default: 150)')
+    parser.add_argument('--format', choices=['jpg', 'png', 'tiff', 'auto'], default='jpg',
+                        help='Image format (jpg, png or tiff); auto picks PNG or JPEG for each page')
+    parser.add_argument('--color-mode', choices=sorted(COLOR_MODE_ARGS), default='color',
+                        help='Render pages in colour, grayscale or 1-bit black and white (default: color)')
+    parser.add_argument('--profile', choices=sorted(ENCODER_PROFILES), default='balanced',
+                        help='Encoder profile: fast, balanced or smallest (default: balanced)')
+    parser.add_argument('--batch-size', type=int, default=5, help='Number of pages per Poppler call (default: 5)')
+    parser.add_argument('--timeout', type=int, default=300, help='Timeout per batch in seconds (default: 300)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of batches rendered in parallel (default: 1)')
+    parser.add_argument('--stream', action='store_true', help='Stream pages from Poppler one at a time')
+    parser.add_argument('--direct', action='store_true', help='Let Poppler write the image files itself')
+    parser.add_argument('--debounce', type=float, default=2.0,
+                        help='Seconds a PDF must stay unchanged before it is converted (default: 2)')
+    parser.add_argument('--poll', action='store_true', help='Poll the folder even where inotify is available')
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help='Seconds between scans when polling (default: 2)')
+    parser.add_argument('--state-file',
+                        help='State index to keep (default: in the cache directory, per input and output folder)')
+    parser.add_argument('--once', action='store_true',
+                        help='Convert the new and changed PDFs, then exit instead of watching')
+    return parser.parse_args(argv)
+
+
+class InotifyWatcher:
+    """Report the names of files changed in one directory, using Linux inotify through libc"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"Cannot watch {directory}")
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds (None: forever) for changes.
+
+        Returns:
+            Set of changed file names, or None when events were lost and
+            the directory has to be scanned again
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        names = set()
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = IN_EVENT_HEADER.unpack_from(data, offset)
+            offset += IN_EVENT_HEADER.size
+            if mask & IN_Q_OVERFLOW:
+                return None
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_watcher(directory, poll=False):
+    """Get an InotifyWatcher for the directory, or None to fall back to polling"""
+    if poll or not sys.platform.startswith('linux'):
+        return None
+    try:
+        return InotifyWatcher(directory)
+    except (OSError, AttributeError):
+        # AttributeError: a libc without inotify
+        return None
+
+
+def is_pdf_name(name):
+    return name.lower().endswith('.pdf') and not name.startswith('.')
+
+
+def get_state_path(input_dir, output_dir):
+    """Default state index location, one per watched folder and output folder"""
+    key = hashlib.sha1(f"{input_dir}\n{output_dir or ''}".encode('utf-8')).hexdigest()
+    return get_cache_dir() / 'watch' / f"{key}.json"
+
+
+def load_state(state_path, settings):
+    """
+    Read the state index, starting a new one if it is missing or was made with other settings.
+
+    The index maps each converted PDF's path to its size, modification
+    time, content hash and the images written for it, along with the hash
+    of the version those images were converted from.
+    """
+    state = read_cache_entry(state_path)
+    if not state or state.get('version') != STATE_VERSION or state.get('settings') != settings:
+        return {'version': STATE_VERSION, 'settings': settings, 'files': {}}
+    return state
+
+
+def get_existing_outputs(pdf_path, output_dir, format, page_count, written=None):
+    """
+    List the images that exist for a PDF's pages.
+
+    Args:
+        written: Optional set of the image paths written by this conversion.
+            When given, only those count, so images left over from an older
+            version of the PDF are not taken for converted pages
+    """
+    output_directory = get_output_directory(pdf_path, output_dir)
+    pdf_name = Path(pdf_path).stem
+    formats = AUTO_FORMATS if format == 'auto' else (format,)
+    outputs = []
+    for page_num in range(1, page_count + 1):
+        for candidate in formats:
+            output_path = output_directory / get_output_filename(pdf_name, page_num, candidate)
+            if output_path.exists() and (written is None or str(output_path) in written):
+                outputs.append(str(output_path))
+                break
+    return outputs
+
+
+class FolderWatcher:
+    """
+    Convert new and changed PDFs in a folder.
+
+    A PDF is converted once its size and modification time have stayed the
+    same for the debounce period, so files still being copied in are left
+    alone. PDFs whose size and modification time match the state index are
+    not read at all; touched files with the same content hash are not
+    converted again.
+    """
+
+    def __init__(self, args):
+        self.input_dir = os.path.abspath(args.input_dir)
+        self.output_dir = os.path.abspath(args.output_dir) if args.output_dir else None
+        self.args = args
+        self.settings = {'output_dir': self.output_dir, 'dpi': args.dpi, 'format': args.format,
+                         'color_mode': args.color_mode, 'profile': args.profile}
+        self.state_path = Path(args.state_file) if args.state_file else get_state_path(self.input_dir,
+                                                                                      self.output_dir)
+        self.state = load_state(self.state_path, self.settings)
+        # Path to (size, mtime_ns, time the file was last seen changing)
+        self.pending = {}
+
+    def check_file(self, path):
+        """Note a new or changed PDF, or forget a deleted one"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.pending.pop(path, None)
+            if self.state['files'].pop(path, None):
+                self.save_state()
+            return
+
+        entry = self.state['files'].get(path)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            self.pending.pop(path, None)
+            return
+
+        previous = self.pending.get(path)
+        if previous and previous[:2] == (stat.st_size, stat.st_mtime_ns):
+            return
+        # A file seen for the first time counts as unchanged since its modification time
+        changed_at = time.time() if previous else min(time.time(), stat.st_mtime_ns / 1e9)
+        self.pending[path] = (stat.st_size, stat.st_mtime_ns, changed_at)
+
+    def scan(self):
+        """Check every PDF in the folder against the state index"""
+        present = set()
+        with os.scandir(self.input_dir) as entries:
+            for entry in entries:
+                if is_pdf_name(entry.name) and entry.is_file():
+                    present.add(entry.path)
+                    self.check_file(entry.path)
+        for path in set(self.state['files']) - present:
+            self.check_file(path)
+
+    def get_ready(self):
+        """Get the pending PDFs that have been left unchanged for the debounce period"""
+        now = time.time()
+        ready = []
+        for path, (size, mtime_ns, changed_at) in list(self.pending.items()):
+            if now - changed_at < self.args.debounce:
+                continue
+            # Check once more in case it changed since it was last seen
+            self.check_file(path)
+            if self.pending.get(path, (None, None))[:2] == (size, mtime_ns):
+                ready.append(path)
+        return sorted(ready)
+
+    def get_wait_time(self):
+        """Seconds until the next pending PDF may be ready, or None when nothing is pending"""
+        if not self.pending:
+            return None
+        now = time.time()
+        return max(0.05, min(changed_at + self.args.debounce - now for _, _, changed_at in self.pending.values()))
+
+    def convert(self, path):
+        """Convert one PDF and record it in the state index"""
+        size, mtime_ns, _ = self.pending.pop(path)
+        previous = self.state['files'].get(path)
+        try:
+            sha256 = get_file_digest(path)
+        except OSError as e:
+            print(f"Error reading {path}: {str(e)}")
+            return
+
+        if previous and previous.get('sha256') == sha256 and not previous.get('failed'):
+            # Touched or copied over with the same content
+            self.state['files'][path] = dict(previous, size=size, mtime_ns=mtime_ns)
+            self.save_state()
+            return
+
+        args = self.args
+        print(f"\n[{time.strftime('%H:%M:%S')}] {'Changed' if previous else 'New'} PDF: {path}")
+        # Images of another version of the file are stale: every page is converted
+        # again and only the images written now count
+        stale = previous is not None and previous.get('converted_sha256') != sha256
+        output_directory = get_output_directory(path, self.output_dir)
+        written = set()
+
+        def record_output(event):
+            if event['event'] == 'page':
+                written.update(str(output_directory / name) for name in event['file'].split(','))
+
+        result = convert_pdf_to_images(path, self.output_dir, dpi=args.dpi, format=args.format,
+                                       overwrite=stale, batch_size=args.batch_size, timeout=args.timeout,
+                                       workers=args.workers, on_event=record_output, stream=args.stream,
+                                       direct=args.direct, profile=args.profile, color_mode=args.color_mode)
+        entry = {'size': size, 'mtime_ns': mtime_ns, 'sha256': sha256, 'outputs': []}
+        if result == 0:
+            page_count = load_document_info(path).page_count
+            entry['outputs'] = get_existing_outputs(path, self.output_dir, args.format, page_count,
+                                                    written if stale else None)
+            # Pages that failed inside an otherwise successful run leave gaps
+            if len(entry['outputs']) < page_count:
+                result = 1
+        if result == 0 or not stale:
+            # The images on disk are all of this version
+            entry['converted_sha256'] = sha256
+        if result != 0:
+            # Not retried until the file changes again
+            entry['failed'] = True
+        else:
+            # Pages a shorter new version no longer has
+            for output_path in set(previous.get('outputs', []) if previous else []) - set(entry['outputs']):
+                try:
+                    os.remove(output_path)
+                except OSError:
+                    pass
+        self.state['files'][path] = entry
+        self.save_state()
+
+    def save_state(self):
+        write_cache_entry(self.state_path, self.state)
+
+    def run(self):
+        watcher = None if self.args.once else open_watcher(self.input_dir, self.args.poll)
+        if not self.args.once:
+            mode = 'inotify' if watcher else f"polling every {self.args.poll_interval:g} seconds"
+            print(f"Watching {self.input_dir} ({mode})")
+        print(f"State index: {self.state_path} ({len(self.state['files'])} PDF(s) already converted)")
+
+        try:
+            self.scan()
+            while True:
+                for path in self.get_ready():
+                    self.convert(path)
+
+                wait_time = self.get_wait_time()
+                if self.args.once:
+                    if wait_time is None:
+                        return 0
+                    time.sleep(wait_time)
+                    self.scan()
+                elif watcher:
+                    names = watcher.wait(wait_time)
+                    if names is None:
+                        self.scan()
+                    for name in names or ():
+                        if is_pdf_name(name):
+                            self.check_file(os.path.join(self.input_dir, name))
+                else:
+                    time.sleep(self.args.poll_interval if wait_time is None
+                               else min(wait_time, self.args.poll_interval))
+                    self.scan()
+        finally:
+            if watcher:
+                watcher.close()
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    if not os.path.isdir(args.input_dir):
+        print(f"Error: {args.input_dir} is not a directory")
+        return 1
+    try:
+        return FolderWatcher(args).run()
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+        return 0
+
+
+if __name__ == "__main__":
+    exit(main())
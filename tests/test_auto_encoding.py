@@ -0,0 +1,47 @@
+import random
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from pdf_to_image import get_auto_encoding
+
+PAGE_SIZE = (1275, 1650)
+
+
+def make_text_page(ink='black'):
+    """A letter page at 150 DPI filled with lines of anti-aliased text"""
+    page = Image.new('RGB', PAGE_SIZE, 'white')
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=14)
+    letters = random.Random(1)
+    for y in range(60, PAGE_SIZE[1] - 50, 18):
+        line = ''.join(letters.choice('abcdefghijklmnopqrstuvwxyz    ') for _ in range(150))
+        draw.text((60, y), line, fill=ink, font=font)
+    return page
+
+
+def make_photo_page():
+    """A page of smooth, noisy colour gradients"""
+    gradient = Image.linear_gradient('L').resize(PAGE_SIZE).convert('RGB')
+    noise = Image.effect_noise(PAGE_SIZE, 60).convert('RGB')
+    red, green, blue = Image.blend(gradient, noise, 0.4).split()
+    photo = Image.merge('RGB', (red, green.point(lambda value: value * 0.7), blue.point(lambda value: 255 - value)))
+    return photo.filter(ImageFilter.GaussianBlur(2))
+
+
+def test_dense_text_page_is_gray_png():
+    assert get_auto_encoding(make_text_page().convert('L')) == ('png', 'L')
+    assert get_auto_encoding(make_text_page()) == ('png', 'L')
+
+
+def test_colour_text_page_is_palette_png():
+    assert get_auto_encoding(make_text_page(ink=(200, 0, 0))) == ('png', 'P')
+
+
+def test_black_and_white_page_is_mono_png():
+    page = make_text_page().convert('L').point(lambda value: 0 if value < 128 else 255)
+    assert get_auto_encoding(page) == ('png', '1')
+
+
+def test_photo_page_is_jpeg():
+    assert get_auto_encoding(make_photo_page()) == ('jpg', 'RGB')
+    assert get_auto_encoding(make_photo_page().convert('L')) == ('jpg', 'L')
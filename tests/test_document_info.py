@@ -0,0 +1,45 @@
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+
+from pdf_to_image import PDFDocumentInfo
+
+
+def make_xobject(subtype, data, **entries):
+    xobject = DecodedStreamObject()
+    xobject.set_data(data)
+    xobject.update({NameObject('/Type'): NameObject('/XObject'), NameObject('/Subtype'): NameObject(subtype)})
+    xobject.update({NameObject(f'/{name}'): value for name, value in entries.items()})
+    return xobject
+
+
+def add_xobject_page(writer, xobject):
+    writer.add_blank_page(612, 792)
+    # add_blank_page returns a copy of the page the writer keeps
+    page = writer.pages[-1]
+    page[NameObject('/Resources')] = DictionaryObject({
+        NameObject('/XObject'): DictionaryObject({NameObject('/X0'): writer._add_object(xobject)})
+    })
+
+
+def write_xobject_pdf(path):
+    """A PDF whose first page holds an image XObject and whose second page holds a Form XObject"""
+    writer = PdfWriter()
+    add_xobject_page(writer, make_xobject('/Image', b'\x00' * 64, Width=NumberObject(8), Height=NumberObject(8),
+                                          ColorSpace=NameObject('/DeviceGray'), BitsPerComponent=NumberObject(8)))
+    add_xobject_page(writer, make_xobject('/Form', b'0 0 10 10 re f', BBox=writer._add_object(DictionaryObject())))
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+
+def test_image_and_form_xobjects(tmp_path):
+    path = tmp_path / 'xobjects.pdf'
+    write_xobject_pdf(path)
+    reader = PdfReader(str(path))
+
+    info = PDFDocumentInfo.from_reader(path, None, reader)
+
+    assert [page['has_images'] for page in info.pages] == [True, False]
+    assert [page['draws'] for page in info.pages] == [True, True]
+    # The XObject streams are not left in the reader's object cache
+    assert not any(getattr(obj, 'get', None) and obj.get('/Type') == '/XObject'
+                   for obj in reader.resolved_objects.values())